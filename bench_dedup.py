@@ -0,0 +1,275 @@
+# bench_dedup.py
+
+# Benchmark backend dedup store: throughput insert/lookup dan ukuran di disk.
+#
+# Contoh:
+#   python bench_dedup.py                      # 10.000.000 key, semua backend
+#   python bench_dedup.py --keys 1000000 --backends sqlite,lmdb
+
+
+
+import argparse
+
+import asyncio
+
+import hashlib
+
+import os
+
+import shutil
+
+import sqlite3
+
+import tempfile
+
+import time
+
+import uuid
+
+
+
+from src.dedup_store import create_dedup_store
+
+
+
+
+
+def allocated(path):
+
+    # Pakai blok yang benar-benar teralokasi: file LMDB adalah sparse file
+
+    # sebesar map_size, jadi getsize() akan menyesatkan.
+
+    return os.stat(path).st_blocks * 512
+
+
+
+
+
+def disk_size(path):
+
+    """Ukuran file/direktori store di disk (termasuk file -wal/-shm SQLite)."""
+
+    if os.path.isdir(path):
+
+        return sum(allocated(os.path.join(root, f))
+
+                   for root, _, files in os.walk(path) for f in files)
+
+    total = 0
+
+    for suffix in ("", "-wal", "-shm"):
+
+        if os.path.exists(path + suffix):
+
+            total += allocated(path + suffix)
+
+    return total
+
+
+
+
+
+def btree_sizes(path):
+
+    """Ukuran per b-tree (tabel & index) dari file SQLite, lewat virtual table 'dbstat'."""
+
+    conn = sqlite3.connect(path)
+
+    try:
+
+        rows = conn.execute(
+
+            "SELECT name, SUM(pgsize) FROM dbstat WHERE name NOT LIKE 'sqlite_%master' GROUP BY name"
+
+        ).fetchall()
+
+    except sqlite3.OperationalError:
+
+        return {}  # SQLite dikompilasi tanpa dbstat
+
+    finally:
+
+        conn.close()
+
+    return {name: size for name, size in rows if size}
+
+
+
+
+
+def make_id(i, mode):
+
+    if mode == "seq":
+
+        return f"evt-{i:012d}"
+
+    # Seperti uuid4 dari publisher, tapi deterministik agar bisa dikirim ulang saat uji lookup
+
+    return str(uuid.UUID(bytes=hashlib.md5(i.to_bytes(8, "big")).digest()))
+
+
+
+
+
+def make_batch(start, size, mode="uuid", topic="bench.topic"):
+
+    return [{"topic": topic, "event_id": make_id(i, mode)} for i in range(start, start + size)]
+
+
+
+
+
+async def bench_backend(backend, keys, batch_size, workdir, ids):
+
+    path = os.path.join(workdir, f"dedup-{backend}")
+
+    store = create_dedup_store(backend, path)
+
+    await store.init_db()
+
+
+
+    # 1. Insert: semua key baru
+
+    t0 = time.perf_counter()
+
+    inserted = 0
+
+    for start in range(0, keys, batch_size):
+
+        new = await store.check_and_add_batch(make_batch(start, min(batch_size, keys - start), ids))
+
+        inserted += len(new)
+
+    insert_sec = time.perf_counter() - t0
+
+
+
+    # 2. Lookup: kirim ulang sampel key yang sudah ada (semua harus duplikat)
+
+    sample = min(keys, 1_000_000)
+
+    t0 = time.perf_counter()
+
+    dup_new = 0
+
+    for start in range(0, sample, batch_size):
+
+        new = await store.check_and_add_batch(make_batch(start, min(batch_size, sample - start), ids))
+
+        dup_new += len(new)
+
+    lookup_sec = time.perf_counter() - t0
+
+
+
+    count = await store.count()
+
+    await store.close()
+
+    size = disk_size(path)
+
+    btrees = btree_sizes(path) if backend.startswith("sqlite") else {}
+
+
+
+    assert inserted == keys, f"{backend}: hanya {inserted}/{keys} key tersimpan"
+
+    assert dup_new == 0, f"{backend}: {dup_new} duplikat lolos"
+
+    assert count == keys, f"{backend}: count() = {count}, seharusnya {keys}"
+
+
+
+    return {
+
+        "backend": backend,
+
+        "insert_rate": keys / insert_sec,
+
+        "lookup_rate": sample / lookup_sec,
+
+        "size_mb": size / 1024 ** 2,
+
+        "bytes_per_key": size / keys,
+
+        "btrees": btrees,
+
+    }
+
+
+
+
+
+async def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark backend dedup store")
+
+    parser.add_argument("--keys", type=int, default=10_000_000)
+
+    parser.add_argument("--batch", type=int, default=100, help="ukuran batch (sama dengan consumer worker)")
+
+    parser.add_argument("--backends", default="sqlite-legacy,sqlite-compact,lmdb")
+
+    parser.add_argument("--ids", choices=["uuid", "seq"], default="uuid",
+
+                        help="uuid = acak seperti publisher asli, seq = berurutan (best case b-tree)")
+
+    parser.add_argument("--dir", default=None, help="folder kerja (default: folder sementara)")
+
+    args = parser.parse_args()
+
+
+
+    workdir = args.dir or tempfile.mkdtemp(prefix="bench-dedup-")
+
+    os.makedirs(workdir, exist_ok=True)
+
+    print(f"Benchmark dedup: {args.keys} key ({args.ids}), batch {args.batch}, folder {workdir}")
+
+
+
+    results = []
+
+    try:
+
+        for backend in args.backends.split(","):
+
+            print(f"  ... menjalankan backend '{backend}'")
+
+            results.append(await bench_backend(backend.strip(), args.keys, args.batch, workdir, args.ids))
+
+    finally:
+
+        if args.dir is None:
+
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+
+    print("\n--- HASIL BENCHMARK ---")
+
+    print(f"  {'backend':<16}{'insert/s':>14}{'lookup/s':>14}{'disk (MB)':>12}{'B/key':>10}")
+
+    for r in results:
+
+        print(f"  {r['backend']:<16}{r['insert_rate']:>14,.0f}{r['lookup_rate']:>14,.0f}"
+
+              f"{r['size_mb']:>12,.1f}{r['bytes_per_key']:>10,.1f}")
+
+    for r in results:
+
+        for name, btree_size in sorted(r["btrees"].items()):
+
+            print(f"  {r['backend']:<16}b-tree {name:<38}{btree_size / 1024 ** 2:>10,.1f} MB")
+
+    print("-----------------------")
+
+
+
+
+
+if __name__ == "__main__":
+
+    asyncio.run(main())
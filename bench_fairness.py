@@ -0,0 +1,145 @@
+# bench_fairness.py
+
+# Latensi antrian publisher "sopan" saat satu publisher lain membanjiri queue:
+
+# asyncio.Queue (FIFO, seperti dulu) vs FairQueue (weighted round-robin per source).
+
+#
+
+# Consumer disimulasikan (batch 100, biaya tetap per batch) agar hasilnya fokus ke penjadwalan.
+
+
+
+import argparse
+
+import asyncio
+
+import time
+
+
+
+from src.fair_queue import FairQueue
+
+
+
+
+
+async def run(queue, duration, batch_cost, polite_rate):
+
+    latencies = []
+
+    stop = time.perf_counter() + duration
+
+
+
+    async def flooder():
+
+        i = 0
+
+        while time.perf_counter() < stop:
+
+            await queue.put({"source": "noisy", "event_id": f"n-{i}", "t": time.perf_counter()})
+
+            i += 1
+
+
+
+    async def polite():
+
+        i = 0
+
+        while time.perf_counter() < stop:
+
+            await queue.put({"source": "polite", "event_id": f"p-{i}", "t": time.perf_counter()})
+
+            i += 1
+
+            await asyncio.sleep(1 / polite_rate)
+
+
+
+    async def consumer():
+
+        while True:
+
+            batch = [await queue.get()]
+
+            while len(batch) < 100 and not queue.empty():
+
+                batch.append(queue.get_nowait())
+
+            now = time.perf_counter()
+
+            latencies.extend(now - ev["t"] for ev in batch if ev["source"] == "polite")
+
+            await asyncio.sleep(batch_cost)  # simulasi transaksi DB
+
+
+
+    worker = asyncio.create_task(consumer())
+
+    await asyncio.gather(flooder(), polite())
+
+    worker.cancel()
+
+    latencies.sort()
+
+    return latencies
+
+
+
+
+
+def pct(values, p):
+
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else float("nan")
+
+
+
+
+
+async def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark fairness queue")
+
+    parser.add_argument("--duration", type=float, default=5.0)
+
+    parser.add_argument("--batch-cost", type=float, default=0.002, help="detik per batch 100 event")
+
+    parser.add_argument("--polite-rate", type=float, default=50.0, help="event/detik publisher sopan")
+
+    args = parser.parse_args()
+
+
+
+    print(f"Flood selama {args.duration}s, publisher sopan {args.polite_rate} ev/s...")
+
+    fifo = await run(asyncio.Queue(maxsize=10000), args.duration, args.batch_cost, args.polite_rate)
+
+    fair = await run(FairQueue(maxsize=10000), args.duration, args.batch_cost, args.polite_rate)
+
+
+
+    print("\n--- LATENSI PUBLISHER SOPAN (ms) ---")
+
+    print(f"  {'queue':<14}{'p50':>10}{'p99':>10}{'n':>8}")
+
+    for name, lat in (("asyncio.Queue", fifo), ("FairQueue", fair)):
+
+        if not lat:
+
+            print(f"  {name:<14}{'starved: tidak ada event sopan yang diproses':>28}")
+
+            continue
+
+        print(f"  {name:<14}{pct(lat, 0.5):>10.2f}{pct(lat, 0.99):>10.2f}{len(lat):>8}")
+
+    print("------------------------------------")
+
+
+
+
+
+if __name__ == "__main__":
+
+    asyncio.run(main())
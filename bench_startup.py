@@ -0,0 +1,163 @@
+# bench_startup.py
+
+# Mengukur time-to-ready aggregator saat cold start vs warm boot dari snapshot.
+#
+# Contoh:
+#   python bench_startup.py --keys 1000000
+#   python bench_startup.py --keys 10000000 --delta 50000
+
+
+
+import argparse
+
+import asyncio
+
+import os
+
+import shutil
+
+import tempfile
+
+import time
+
+
+
+
+
+async def fill(store, start, count, batch=10_000):
+
+    for i in range(start, start + count, batch):
+
+        n = min(batch, start + count - i)
+
+        await store.check_and_add_batch(
+
+            [{"topic": f"bench.{j % 10}", "event_id": f"evt-{j:012d}"} for j in range(i, i + n)]
+
+        )
+
+
+
+
+
+async def boot(Aggregator):
+
+    """Mengembalikan (aggregator, detik sampai ready, detik sampai warm-up selesai)."""
+
+    agg = Aggregator()
+
+    t0 = time.perf_counter()
+
+    await agg.initialize()
+
+    ready = time.perf_counter() - t0
+
+    await agg.warmup_done.wait()
+
+    warm = time.perf_counter() - t0
+
+    return agg, ready, warm
+
+
+
+
+
+async def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark time-to-ready aggregator")
+
+    parser.add_argument("--keys", type=int, default=1_000_000)
+
+    parser.add_argument("--delta", type=int, default=10_000, help="key baru setelah snapshot terakhir")
+
+    parser.add_argument("--backend", default="sqlite")
+
+    args = parser.parse_args()
+
+
+
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+
+    # Path store & snapshot dibaca saat import, jadi env harus di-set dulu
+
+    os.environ["DATA_DIR"] = workdir
+
+    os.environ["DEDUP_BACKEND"] = args.backend
+
+    from src.aggregator import Aggregator
+
+
+
+    try:
+
+        print(f"Mengisi {args.keys} key ({args.backend}) di {workdir}...")
+
+        agg = Aggregator()
+
+        await agg.store.init_db()
+
+        await fill(agg.store, 0, args.keys)
+
+        t0 = time.perf_counter()
+
+        await agg.store.count()
+
+        legacy = time.perf_counter() - t0
+
+        await agg.store.close()
+
+
+
+        # 1. Cold start: tidak ada snapshot -> replay seluruh DB di background
+
+        agg, cold_ready, cold_warm = await boot(Aggregator)
+
+        await agg.shutdown()  # menulis snapshot
+
+        await agg.store.close()
+
+
+
+        # 2. Warm boot: snapshot + delta kecil yang belum masuk snapshot
+
+        agg = Aggregator()
+
+        await agg.store.init_db()
+
+        await fill(agg.store, args.keys, args.delta)
+
+        await agg.store.close()
+
+        agg, snap_ready, snap_warm = await boot(Aggregator)
+
+        expected = args.keys + args.delta
+
+        assert agg.stats["unique_events"] == expected, f"{agg.stats['unique_events']} != {expected}"
+
+        await agg.shutdown()
+
+        await agg.store.close()
+
+    finally:
+
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+
+    print("\n--- HASIL BENCHMARK STARTUP ---")
+
+    print(f"  COUNT(*) saat boot (cara lama):   {legacy:8.3f}s")
+
+    print(f"  Cold start   -> ready:            {cold_ready:8.3f}s   warm-up selesai: {cold_warm:8.3f}s")
+
+    print(f"  Snapshot     -> ready:            {snap_ready:8.3f}s   warm-up selesai: {snap_warm:8.3f}s  (delta {args.delta})")
+
+    print("-------------------------------")
+
+
+
+
+
+if __name__ == "__main__":
+
+    asyncio.run(main())
@@ -0,0 +1,561 @@
+# crash_test.py
+
+# Harness crash-recovery: aggregator dijalankan sebagai subprocess (uvicorn) dengan DATA_DIR
+
+# sementara, dibebani publish terus-menerus (dengan duplikat), di-SIGKILL di titik acak,
+
+# lalu di-restart. Batch yang belum di-ack dikirim ulang (event_id yang sama).
+
+# Di akhir diverifikasi: tidak ada event yang hilang atau dihitung dua kali.
+
+# Exit code 1 jika ada invariant yang dilanggar atau batas recovery/throughput terlewati.
+
+
+
+import argparse
+
+import asyncio
+
+import os
+
+import random
+
+import shutil
+
+import signal
+
+import subprocess
+
+import sys
+
+import tempfile
+
+import time
+
+import uuid
+
+from datetime import datetime, timezone
+
+
+
+import httpx
+
+
+
+from src.publisher_client import PublisherClient
+
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+
+# Jendela (detik) untuk mengukur throughput sebelum crash vs sesudah pulih
+
+RATE_WINDOW = 2.0
+
+
+
+
+
+class Server:
+
+    """Satu proses uvicorn; start() lagi setelah kill() = restart dengan DATA_DIR yang sama."""
+
+
+
+    def __init__(self, data_dir, port, extra_env):
+
+        self.data_dir = data_dir
+
+        self.port = port
+
+        self.url = f"http://127.0.0.1:{port}"
+
+        self.env = {**os.environ, "DATA_DIR": data_dir, **extra_env}
+
+        self.proc = None
+
+        self.log = open(os.path.join(data_dir, "server.log"), "ab")
+
+
+
+    def start(self):
+
+        self.proc = subprocess.Popen(
+
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(self.port)],
+
+            cwd=ROOT, env=self.env, stdout=self.log, stderr=subprocess.STDOUT,
+
+        )
+
+
+
+    async def wait_ready(self, client, timeout):
+
+        """Menunggu /readyz 200 (DB terbuka + warm-up selesai). Mengembalikan detik sejak spawn."""
+
+        started = time.monotonic()
+
+        while time.monotonic() - started < timeout:
+
+            if self.proc.poll() is not None:
+
+                raise RuntimeError(f"Server keluar dengan kode {self.proc.returncode}, lihat {self.log.name}")
+
+            try:
+
+                if (await client.get(f"{self.url}/readyz")).status_code == 200:
+
+                    return time.monotonic() - started
+
+            except httpx.TransportError:
+
+                pass
+
+            await asyncio.sleep(0.05)
+
+        raise RuntimeError(f"Server tidak siap dalam {timeout}s")
+
+
+
+    def kill(self):
+
+        self.proc.send_signal(signal.SIGKILL)
+
+        self.proc.wait()
+
+
+
+    def stop(self):
+
+        if self.proc and self.proc.poll() is None:
+
+            self.proc.terminate()
+
+            try:
+
+                self.proc.wait(timeout=30)
+
+            except subprocess.TimeoutExpired:
+
+                self.proc.kill()
+
+        self.log.close()
+
+
+
+
+
+class Load:
+
+    """
+
+    Generator beban + pencatat ack. Event dikirim lewat PublisherClient(durable=True),
+
+    jadi future-nya baru selesai setelah /publish?wait=true menjawab 202, yaitu setelah
+
+    di-commit ke dedup store. Event yang future-nya gagal (retry client habis) dikirim ulang.
+
+    """
+
+
+
+    def __init__(self, batch_size, dup_ratio, topics):
+
+        self.batch_size = batch_size
+
+        self.dup_ratio = dup_ratio
+
+        self.topics = topics
+
+        self.sent = {}          # (topic, event_id) -> event, semua yang PERNAH dikirim
+
+        self.keys = []          # key di 'sent' dalam bentuk list (untuk memilih duplikat acak)
+
+        self.acked = set()      # (topic, event_id) yang sudah di-ack
+
+        self.pending = []       # batch yang gagal/tanpa ack -> dikirim ulang apa adanya
+
+        self.ack_log = []       # (waktu monotonic, jumlah event) per batch yang di-ack
+
+        self.resent_batches = 0
+
+
+
+    def new_batch(self):
+
+        batch = []
+
+        for _ in range(self.batch_size):
+
+            if self.keys and random.random() < self.dup_ratio:
+
+                batch.append(self.sent[random.choice(self.keys)])
+
+            else:
+
+                event = {
+
+                    "topic": random.choice(self.topics),
+
+                    "event_id": str(uuid.uuid4()),
+
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+
+                    "source": "crash-test",
+
+                    "payload": {"n": len(self.sent)},
+
+                }
+
+                self.sent[(event["topic"], event["event_id"])] = event
+
+                self.keys.append((event["topic"], event["event_id"]))
+
+                batch.append(event)
+
+        return batch
+
+
+
+    async def sender(self, publisher, ready, stop):
+
+        while not stop.is_set():
+
+            await ready.wait()
+
+            if self.pending:
+
+                batch = self.pending.pop()
+
+                self.resent_batches += 1
+
+            else:
+
+                batch = self.new_batch()
+
+            futures = await publisher.publish_many(batch)
+
+            results = await asyncio.gather(*futures, return_exceptions=True)
+
+            acked = [e for e, result in zip(batch, results) if result is None]
+
+            failed = [e for e, result in zip(batch, results) if result is not None]
+
+            if acked:
+
+                self.acked.update((e["topic"], e["event_id"]) for e in acked)
+
+                self.ack_log.append((time.monotonic(), len(acked)))
+
+            if failed:
+
+                self.pending.append(failed)
+
+                await asyncio.sleep(0.05)
+
+
+
+    def rate(self, start, end):
+
+        n = sum(count for t, count in self.ack_log if start <= t < end)
+
+        return n / (end - start) if end > start else 0.0
+
+
+
+
+
+async def publish_all(publisher, events):
+
+    futures = await publisher.publish_many(events)
+
+    await publisher.flush()
+
+    # PublishError jika ada batch yang tetap gagal setelah semua retry
+
+    await asyncio.gather(*futures)
+
+
+
+
+
+async def run(args):
+
+    data_dir = tempfile.mkdtemp(prefix="crash-test-")
+
+    extra_env = {
+
+        "SNAPSHOT_INTERVAL": str(args.snapshot_interval),
+
+        "ARCHIVE_INTERVAL": "0",
+
+        "MEMORY_LOG_INTERVAL": "0",
+
+    }
+
+    if args.backend:
+
+        extra_env["DEDUP_BACKEND"] = args.backend
+
+    server = Server(data_dir, args.port, extra_env)
+
+    load = Load(args.batch, args.dup_ratio, [f"crash.t{i}" for i in range(args.topics)])
+
+    failures = []
+
+    crashes = []
+
+
+
+    print(f"Crash test: {args.crashes} crash, DATA_DIR={data_dir}, backend={args.backend or 'default'}")
+
+    # Backoff pendek: batch yang sedang di jalan saat crash di-retry oleh client sampai server pulih
+
+    publisher = PublisherClient(server.url, batch_size=args.batch, linger=0.005, durable=True,
+
+                                max_in_flight=args.concurrency, backoff_base=0.05, backoff_max=0.5,
+
+                                timeout=30)
+
+    async with httpx.AsyncClient(timeout=30) as client, publisher:
+
+        server.start()
+
+        await server.wait_ready(client, args.max_recovery * 3)
+
+
+
+        ready, stop = asyncio.Event(), asyncio.Event()
+
+        ready.set()
+
+        senders = [asyncio.create_task(load.sender(publisher, ready, stop)) for _ in range(args.concurrency)]
+
+
+
+        try:
+
+            for i in range(args.crashes):
+
+                await asyncio.sleep(random.uniform(args.min_interval, args.max_interval))
+
+                acked_before = len(load.acked)
+
+                killed_at = time.monotonic()
+
+                ready.clear()
+
+                server.kill()
+
+                rate_before = load.rate(killed_at - RATE_WINDOW, killed_at)
+
+
+
+                server.start()
+
+                recovery = await server.wait_ready(client, args.max_recovery * 3)
+
+                ready_at = time.monotonic()
+
+                ready.set()
+
+                await asyncio.sleep(RATE_WINDOW)
+
+                rate_after = load.rate(ready_at, ready_at + RATE_WINDOW)
+
+
+
+                # Semua yang sudah di-ack sebelum crash harus tetap terhitung setelah restart
+
+                stats = (await client.get(f"{server.url}/stats")).json()
+
+                if stats["unique_events"] < acked_before:
+
+                    failures.append(f"crash {i + 1}: unique_events {stats['unique_events']} < acked {acked_before} (event hilang)")
+
+                if recovery > args.max_recovery:
+
+                    failures.append(f"crash {i + 1}: recovery {recovery:.2f}s > {args.max_recovery}s")
+
+                dip = 1 - rate_after / rate_before if rate_before else 0.0
+
+                crashes.append((i + 1, acked_before, recovery, rate_before, rate_after, dip))
+
+                print(f"  crash {i + 1}: {acked_before} event di-ack sebelum kill, pulih {recovery:.2f}s, "
+
+                      f"throughput {rate_before:.0f} -> {rate_after:.0f} ev/s (dip {dip * 100:.0f}%)")
+
+        finally:
+
+            stop.set()
+
+            await asyncio.gather(*senders, return_exceptions=True)
+
+
+
+        # Batch yang belum di-ack saat load dihentikan
+
+        while load.pending:
+
+            batch = load.pending.pop()
+
+            await publish_all(publisher, batch)
+
+            load.acked.update((e["topic"], e["event_id"]) for e in batch)
+
+            load.resent_batches += 1
+
+
+
+        # --- Verifikasi ---
+
+        all_keys = set(load.sent)
+
+        if load.acked != all_keys:
+
+            failures.append(f"{len(all_keys - load.acked)} event terkirim tapi tidak pernah di-ack")
+
+        stats = (await client.get(f"{server.url}/stats")).json()
+
+        if stats["unique_events"] != len(all_keys):
+
+            failures.append(f"unique_events {stats['unique_events']} != {len(all_keys)} event unik terkirim")
+
+
+
+        # Crash terakhir tanpa beban: counter harus pulih tepat sama (snapshot + replay delta)
+
+        server.kill()
+
+        server.start()
+
+        await server.wait_ready(client, args.max_recovery * 3)
+
+        stats = (await client.get(f"{server.url}/stats")).json()
+
+        if stats["unique_events"] != len(all_keys):
+
+            failures.append(f"setelah restart akhir: unique_events {stats['unique_events']} != {len(all_keys)}")
+
+
+
+        # Kirim ulang SEMUA event: tidak boleh ada yang dianggap baru (dedup bertahan lintas crash)
+
+        await publish_all(publisher, list(load.sent.values()))
+
+        stats = (await client.get(f"{server.url}/stats")).json()
+
+        if stats["unique_events"] != len(all_keys) or stats["duplicates"] != len(all_keys):
+
+            failures.append(
+
+                f"republish semua: unique_events {stats['unique_events']} (harus {len(all_keys)}), "
+
+                f"duplicates {stats['duplicates']} (harus {len(all_keys)})"
+
+            )
+
+
+
+    server.stop()
+
+
+
+    min_ratio = min((after / before for _, _, _, before, after, _ in crashes if before), default=1.0)
+
+    if crashes and min_ratio < args.min_throughput_ratio:
+
+        failures.append(f"throughput setelah pulih {min_ratio * 100:.0f}% < {args.min_throughput_ratio * 100:.0f}% dari sebelum crash")
+
+
+
+    print("\n--- HASIL CRASH TEST ---")
+
+    print(f"  Event unik terkirim:   {len(load.sent)}")
+
+    print(f"  Batch dikirim ulang:   {load.resent_batches}")
+
+    if crashes:
+
+        print(f"  Recovery rata-rata:    {sum(c[2] for c in crashes) / len(crashes):.2f}s (maks {max(c[2] for c in crashes):.2f}s)")
+
+        print(f"  Throughput dip maks:   {max(c[5] for c in crashes) * 100:.0f}%")
+
+    print("------------------------")
+
+
+
+    if failures:
+
+        print(f"\nGAGAL ({len(failures)}), log server: {os.path.join(data_dir, 'server.log')}")
+
+        for failure in failures:
+
+            print(f"  - {failure}")
+
+        return 1
+
+    print("\nOK: tidak ada event hilang atau dihitung dua kali.")
+
+    if not args.keep:
+
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return 0
+
+
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Crash-recovery test: SIGKILL acak + restart + verifikasi dedup")
+
+    parser.add_argument("--crashes", type=int, default=5)
+
+    parser.add_argument("--min-interval", type=float, default=1.0, help="detik minimum antar crash")
+
+    parser.add_argument("--max-interval", type=float, default=4.0, help="detik maksimum antar crash")
+
+    parser.add_argument("--batch", type=int, default=100)
+
+    parser.add_argument("--concurrency", type=int, default=4)
+
+    parser.add_argument("--dup-ratio", type=float, default=0.3)
+
+    parser.add_argument("--topics", type=int, default=4)
+
+    parser.add_argument("--backend", default="", help="DEDUP_BACKEND untuk server (default: bawaan)")
+
+    parser.add_argument("--snapshot-interval", type=float, default=1.0)
+
+    parser.add_argument("--port", type=int, default=18090)
+
+    parser.add_argument("--max-recovery", type=float, default=10.0, help="gagal jika recovery lebih lama (detik)")
+
+    parser.add_argument("--min-throughput-ratio", type=float, default=0.2,
+
+                        help="gagal jika throughput setelah pulih < rasio ini x sebelum crash")
+
+    parser.add_argument("--seed", type=int, default=None)
+
+    parser.add_argument("--keep", action="store_true", help="jangan hapus DATA_DIR sementara")
+
+    args = parser.parse_args()
+
+    if args.seed is not None:
+
+        random.seed(args.seed)
+
+    sys.exit(asyncio.run(run(args)))
+
+
+
+
+
+if __name__ == "__main__":
+
+    main()
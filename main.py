@@ -2,16 +2,28 @@
 
 
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
+
+from fastapi.responses import JSONResponse, Response
 
 from datetime import datetime, timezone
 
 from src.aggregator import Aggregator
 
+from src.changelog import CHANGES_MAX_LIMIT
+
+from src.timeseries import RESOLUTIONS
+
 from contextlib import asynccontextmanager
 
+import gzip
+
+import json
+
 import logging
 
+import math
+
 import os
 
 import asyncio # <-- Import asyncio
@@ -52,7 +64,7 @@ async def lifespan(app: FastAPI):
 
     log.info("Server shutting down.")
 
-    await aggregator.shutdown() # <-- Ini menghentikan worker
+    await aggregator.shutdown() # <-- Drain queue, snapshot, lalu hentikan worker
 
 
 
@@ -72,7 +84,7 @@ START_TIME = datetime.now(timezone.utc).isoformat()
 
 @app.post("/publish", status_code=202)
 
-async def publish_event(request: Request):
+async def publish_event(request: Request, wait: bool = False):
 
     """
 
@@ -80,15 +92,55 @@ async def publish_event(request: Request):
 
     Hanya memasukkan event ke queue, tidak memblokir.
 
+    Dengan ?wait=true respons baru dikirim setelah semua event di request ini
+
+    di-commit ke dedup store (ack durable: aman terhadap crash proses).
+
     """
 
-    body = await request.json()
+    if aggregator.replica is not None:
 
+        raise HTTPException(status_code=403, detail=f"Instance ini replica read-only; publish ke primary {aggregator.replica.primary_url}")
 
+    if not aggregator.accepting:
 
-    if "events" in body:
+        # Sedang shutdown/draining: publisher harus retry ke instance lain
+
+        raise HTTPException(status_code=503, detail="Aggregator sedang shutdown, tidak menerima event")
+
+
+
+    body = await _read_json(request)
+
+    events = body["events"] if "events" in body else [body]
+
+
+
+    # Token bucket per source/topic: publisher yang membanjiri ditolak, yang lain tidak terganggu
+
+    retry_after = aggregator.admit(events)
 
-        events = body["events"]
+    if retry_after is not None:
+
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if math.isfinite(retry_after) else {}
+
+        raise HTTPException(status_code=429, detail="Rate limit per source/topic terlampaui", headers=headers)
+
+
+
+    if wait:
+
+        try:
+
+            await aggregator.queue_batch(events, wait=True)
+
+        except RuntimeError as e:
+
+            raise HTTPException(status_code=503, detail=f"Event belum di-commit: {e}")
+
+        return {"status": "committed", "queued_count": len(events)}
+
+    if "events" in body:
 
         # 'await' di sini hanya menunggu event dimasukkan ke queue (in-memory)
 
@@ -104,23 +156,219 @@ async def publish_event(request: Request):
 
 
 
+async def _read_json(request: Request):
+
+    """Body JSON, opsional dikompresi (Content-Encoding: gzip, dikirim oleh PublisherClient)."""
+
+    raw = await request.body()
+
+    try:
+
+        if request.headers.get("content-encoding", "").lower() == "gzip":
+
+            raw = gzip.decompress(raw)
+
+        return json.loads(raw)
+
+    except (OSError, EOFError, ValueError):
+
+        raise HTTPException(status_code=400, detail="Body bukan JSON (gzip) yang valid")
+
+
+
+def _parse_time(value: str, name: str):
+
+    """Parameter waktu: ISO-8601 (mis. 2025-01-01T10:00:00Z) atau epoch detik."""
+
+    if value is None:
+
+        return None
+
+    try:
+
+        return float(value)
+
+    except ValueError:
+
+        pass
+
+    try:
+
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+    except ValueError:
+
+        raise HTTPException(status_code=400, detail=f"Parameter '{name}' bukan waktu yang valid: {value}")
+
+    if dt.tzinfo is None:
+
+        dt = dt.replace(tzinfo=timezone.utc)
+
+    return dt.timestamp()
+
+
+
+async def _cached_json(request: Request, key: tuple, extra: dict = None):
+
+    """
+
+    Response JSON dengan ETag dari counter versi aggregator.
+
+    If-None-Match yang cocok -> 304 tanpa lock dan tanpa serialize.
+
+    """
+
+    current = aggregator.etag(key)
+
+    if request.headers.get("if-none-match") == current:
+
+        return Response(status_code=304, headers={"ETag": current})
+
+    etag, body = await aggregator.cached_response(key, extra)
+
+    return Response(content=body, media_type="application/json",
+
+                    headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+
 @app.get("/events")
 
-async def get_events(topic: str = None):
+async def get_events(request: Request, topic: str = None, start: str = None, end: str = None):
+
+    # Dengan start/end: gabungan event panas (memori) + arsip yang overlap rentang tsb (tidak di-cache)
+
+    if start is not None or end is not None:
+
+        return await aggregator.get_events(topic, _parse_time(start, "start"), _parse_time(end, "end"))
+
+    return await _cached_json(request, ("events", topic))
+
+
+
+@app.get("/changes")
+
+async def get_changes(offset: int = 0, limit: int = 500):
+
+    """
+
+    Change feed (primary): record berurutan berisi event unik yang sudah di-commit dan
+
+    delta counter per batch. Replica memanggil ini dengan 'offset' = next_offset terakhir.
+
+    """
+
+    if aggregator.changelog is None:
+
+        raise HTTPException(status_code=404, detail="Change feed tidak aktif di instance ini")
+
+    if offset < 0 or not 1 <= limit <= CHANGES_MAX_LIMIT:
+
+        raise HTTPException(status_code=400, detail=f"offset harus >= 0 dan limit 1..{CHANGES_MAX_LIMIT}")
+
+    return await aggregator.read_changes(offset, limit)
+
+
+
+@app.get("/admin/memory")
+
+async def admin_memory(tracemalloc: bool = False, top: int = 20):
+
+    """
+
+    Estimasi memori per struktur (cache per topic, queue, response cache, time series, store).
+
+    tracemalloc=true: diff alokasi sejak panggilan sebelumnya (butuh MEMORY_TRACEMALLOC=1).
+
+    """
+
+    report = aggregator.memory_report()
+
+    if tracemalloc:
+
+        if not aggregator.tracer.enabled:
+
+            raise HTTPException(status_code=409, detail="tracemalloc tidak aktif; jalankan dengan MEMORY_TRACEMALLOC=1")
+
+        report["tracemalloc_diff"] = await aggregator.memory_diff(top)
+
+    return report
 
-    return await aggregator.get_events(topic)
+
+
+@app.get("/healthz")
+
+async def healthz():
+
+    """Liveness: proses hidup dan consumer worker masih berjalan."""
+
+    if not aggregator.is_alive():
+
+        return JSONResponse({"status": "dead"}, status_code=503)
+
+    return {"status": "ok"}
+
+
+
+@app.get("/readyz")
+
+async def readyz():
+
+    """Readiness: DB siap, warm-up selesai, queue masih punya ruang."""
+
+    status = aggregator.readiness()
+
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 
 
 @app.get("/stats")
 
-async def get_stats():
+async def get_stats(request: Request):
+
+    return await _cached_json(request, ("stats",), {"start_time": START_TIME})
+
+
+
+@app.get("/stats/timeseries")
+
+async def get_stats_timeseries(topic: str = None, source: str = None,
+
+                               resolution: str = "minute", window: int = 60):
+
+    """
+
+    Event unik & duplikat per bucket waktu (per menit: 24 jam terakhir, per jam: 48 jam terakhir).
+
+    Dihitung dari counter incremental, biayanya tidak bergantung pada jumlah event.
+
+    """
+
+    if resolution not in RESOLUTIONS:
+
+        raise HTTPException(status_code=400, detail=f"resolution harus salah satu dari {list(RESOLUTIONS)}")
+
+    try:
+
+        buckets = await aggregator.get_timeseries(topic, source, resolution, window)
+
+    except ValueError as e:
+
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+
+        "topic": topic,
+
+        "source": source,
+
+        "resolution": resolution,
 
-    stats = await aggregator.get_stats()
+        "bucket_seconds": RESOLUTIONS[resolution][0],
 
-    stats["start_time"] = START_TIME
+        "buckets": buckets,
 
-    return stats
+    }
 
 
 
@@ -4,89 +4,71 @@
 
 
 
-import httpx
-
 import asyncio
 
 import uuid
 
 import random
 
-import time
-
 from datetime import datetime, timezone
 
 
 
-# Nama 'aggregator' akan di-resolve oleh jaringan internal Docker Compose
-
-AGGREGATOR_URL = "http://aggregator:8080"
-
+from src.publisher_client import PublisherClient
 
 
-async def wait_for_aggregator():
 
-    print("Publisher: Menunggu aggregator siap...")
-
-    while True:
+# Nama 'aggregator' akan di-resolve oleh jaringan internal Docker Compose
 
-        try:
+AGGREGATOR_URL = "http://aggregator:8080"
 
-            async with httpx.AsyncClient(base_url=AGGREGATOR_URL) as client:
 
-                resp = await client.get("/stats")
 
-                if resp.status_code == 200:
 
-                    print("Publisher: Aggregator siap.")
 
-                    return
+async def main():
 
-        except httpx.ConnectError:
+    async with PublisherClient(AGGREGATOR_URL) as client:
 
-            pass
+        print("Publisher: Menunggu aggregator siap...")
 
-        await asyncio.sleep(1)
+        # Polling /readyz lewat koneksi keep-alive yang sama dengan publish
 
+        await client.wait_ready()
 
+        print("Publisher: Aggregator siap.")
 
-async def main():
 
-    await wait_for_aggregator()
 
-   
+        unique_ids = [str(uuid.uuid4()) for _ in range(100)]
 
-    unique_ids = [str(uuid.uuid4()) for _ in range(100)]
+        events = []
 
-    events = []
+        for i in range(150): # Kirim 150 event (50 duplikat)
 
-    for i in range(150): # Kirim 150 event (50 duplikat)
+            ev_id = random.choice(unique_ids)
 
-        ev_id = random.choice(unique_ids)
+            events.append({
 
-        events.append({
+                "topic": "compose.test", "event_id": ev_id,
 
-            "topic": "compose.test", "event_id": ev_id,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
 
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+                "source": "compose-publisher", "payload": {}
 
-            "source": "compose-publisher", "payload": {}
+            })
 
-        })
 
-       
 
-    async with httpx.AsyncClient(base_url=AGGREGATOR_URL) as client:
+        futures = await client.publish_many(events)
 
-        try:
+        await client.flush()
 
-            resp = await client.post("/publish", json={"events": events})
+        failed = sum(1 for f in futures if f.exception() is not None)
 
-            print(f"Publisher: Mengirim 150 event. Status: {resp.status_code}")
+        print(f"Publisher: Mengirim 150 event. Gagal: {failed}. Metrik: {client.metrics()}")
 
-        except Exception as e:
 
-            print(f"Publisher: Gagal mengirim event: {e}")
 
 
 
@@ -94,4 +76,4 @@ if __name__ == "__main__":
 
     print("Publisher: Mulai...")
 
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -2,20 +2,64 @@
 
 import asyncio
 from datetime import datetime, timezone
-from .dedup_store import DedupStore
+from .archive import ArchiveStore, ARCHIVE_AFTER_SECONDS, ARCHIVE_INTERVAL, event_time
+from .changelog import ChangeLog, CHANGELOG_ENABLED
+from .dedup_store import create_dedup_store
+from .fair_queue import FairQueue, event_source
+from .fingerprint import FingerprintPolicy
+from .memory import (MemoryAccounting, TracemallocDiff, POINTER_BYTES, MEMORY_EVICT_TARGET,
+                     MEMORY_LOG_INTERVAL, MEMORY_SOFT_LIMIT_MB, MEMORY_TRACEMALLOC, rss_bytes)
+from .rate_limiter import RateLimiter, RateMeter, RATE_WINDOW
+from .replication import ReplicaFollower, REPLICA_OF
+from .snapshot import SnapshotManager, SNAPSHOT_CACHE_PER_TOPIC, SNAPSHOT_INTERVAL
+from .timeseries import TimeSeries
+import json
 import logging
+import math
 import os
+import shutil
+import time
+import uuid
 
 log = logging.getLogger("uvicorn")
 
+# Batas waktu (detik) untuk menghabiskan queue saat shutdown
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "10"))
+
+# /readyz gagal jika queue sudah terisi lebih dari fraksi ini
+READY_QUEUE_THRESHOLD = float(os.getenv("READY_QUEUE_THRESHOLD", "0.9"))
+
 class Aggregator:
-    def __init__(self):
-        self.store = DedupStore()
-        # Queue ini adalah inti dari arsitektur performa tinggi
-        self.queue = asyncio.Queue(maxsize=10000)
+    def __init__(self, replica_of: str = REPLICA_OF):
+        # Backend dipilih lewat env DEDUP_BACKEND (sqlite / lmdb)
+        self.store = create_dedup_store()
+        self.snapshots = SnapshotManager()
+        # Tier dingin: event lama dipindah dari topics_cache ke segmen terkompresi
+        self.archive = ArchiveStore()
+        # Primary: change feed untuk replica. Replica: follower yang mengikuti primary
+        # (read-only, tanpa dedup store & consumer).
+        self.replica = ReplicaFollower(replica_of, self._apply_changes) if replica_of else None
+        self.changelog = ChangeLog() if CHANGELOG_ENABLED and self.replica is None else None
+        self.replica_task = None
+        # Queue ini adalah inti dari arsitektur performa tinggi.
+        # FairQueue: antrian per 'source' + weighted round-robin ke consumer.
+        self.queue = FairQueue(maxsize=10000)
+        # Admission control (token bucket) per source/topic di /publish
+        self.rate_limiter = RateLimiter()
+        # source -> {"meter": RateMeter, "accepted": int, "rejected": int}
+        self.source_stats = {}
         self.worker_task = None
-        
-        self.topics_cache = {} 
+        self.warmup_task = None
+        self.archiver_task = None
+        self.snapshot_task = None
+
+        self.topics_cache = {}
+        # Jumlah event unik per topic (termasuk yang tidak ada di cache)
+        self.topic_counts = {}
+        # Counter unik/duplikat per (topic, source) per menit & per jam, memori tetap
+        self.timeseries = TimeSeries()
+        # Strategi dedup per topic (event_id atau fingerprint isi event)
+        self.fingerprints = FingerprintPolicy()
         self.stats = {
             "received_events": 0,
             "unique_events": 0,
@@ -23,65 +67,419 @@ class Aggregator:
             "last_updated": None,
         }
         # Lock ini HANYA melindungi stats & cache (bukan database)
-        self.lock = asyncio.Lock() 
+        self.lock = asyncio.Lock()
+
+        # Warm-up: replay delta dari DB sejak snapshot terakhir (berjalan di background)
+        # warmup_done HANYA di-set jika replay sukses; gagal -> warmup_failed (tidak ready, tanpa snapshot)
+        self.warmup_done = asyncio.Event()
+        self.warmup_failed = False
+        self._last_snapshot = time.monotonic()
+
+        # Status untuk /healthz & /readyz
+        self.db_ready = False
+        self.accepting = False
+
+        # Versi konten untuk ETag: dinaikkan setiap kali consumer/archiver mengubah state.
+        # Response yang sudah di-serialize di-cache per (resource, versi).
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.stats_version = 0
+        self.events_version = 0     # versi gabungan semua topic (untuk /events tanpa filter)
+        self.topic_versions = {}    # topic -> versi
+        self.response_cache = {}    # key resource -> (etag, bytes)
+        self._last_admit = 0.0
+
+        # Estimasi memori incremental (per topic di cache), log berkala & soft limit
+        self.memory = MemoryAccounting()
+        self.tracer = TracemallocDiff()
+        self.memory_task = None
+        self.evict_task = None
+        self._last_evict = 0.0
+
+        # Ack durable untuk /publish?wait=true: id(event) -> [sisa event, future].
+        # Future selesai setelah event terakhir dari request tsb di-commit ke store.
+        self._acks = {}
+
+        # Shutdown menghentikan consumer DI ANTARA batch, tidak pernah di tengah batch:
+        # batch yang sudah dikirim ke writer thread tetap di-commit, jadi stats-nya harus ikut.
+        self._stop_worker = False
+        self._batch_idle = asyncio.Event()
+        self._batch_idle.set()
 
     async def initialize(self):
         """Dipanggil oleh 'lifespan' untuk inisialisasi DB DAN memulai worker."""
+        if self.replica is not None:
+            await self._initialize_replica()
+            return
+
+        # 1. Pastikan tabel ada
         await self.store.init_db()
-        # Memulai satu worker tunggal yang akan memproses queue
+        if self.changelog is not None:
+            await asyncio.to_thread(self.changelog.open)
+            log.warning(f"CHANGELOG: Change feed aktif ({self.changelog.head} record), "
+                        f"{self.changelog.path} tumbuh tanpa batas (belum ada retensi).")
+        self.db_ready = True
+
+        # 2. Muat snapshot terakhir (jika ada) -> state langsung tersedia tanpa scan DB
+        snapshot = await asyncio.to_thread(self.snapshots.load)
+        cursor = None
+        async with self.lock:
+            # Stats received & duplicates dimulai dari 0 untuk SESI INI.
+            # Ini adalah keputusan desain, tapi ini yang paling logis.
+            self.stats["received_events"] = 0
+            self.stats["duplicates"] = 0
+            if snapshot:
+                cursor = snapshot["cursor"]
+                self.stats["unique_events"] = snapshot["stats"]["unique_events"]
+                self.stats["last_updated"] = snapshot["stats"]["last_updated"]
+                self.topics_cache = snapshot["topics_cache"]
+                self.topic_counts = snapshot["topic_counts"]
+                log.info(
+                    f"LOAD STATE: Snapshot dimuat ({self.stats['unique_events']} event unik, "
+                    f"{len(self.topics_cache)} topic). Replay delta di background..."
+                )
+            else:
+                self.stats["unique_events"] = 0
+                self.topic_counts = {}
+
+            # State baru -> semua ETag lama tidak berlaku lagi
+            self.boot_id = uuid.uuid4().hex[:8]
+            self.response_cache.clear()
+            self._bump_versions(self.topics_cache)
+            self.memory.load(self.topics_cache)
+
+        # 3. Semua yang di-commit SETELAH titik ini akan dihitung oleh consumer worker,
+        #    jadi warm-up hanya me-replay key dengan processed_at <= boot_mark.
+        boot_mark = time.time()
+        self.warmup_done.clear()
+        self.warmup_failed = False
+        self.warmup_task = asyncio.create_task(self._warm_up(cursor, boot_mark))
+
+        # 4. Memulai satu worker tunggal yang akan memproses queue (tidak menunggu warm-up)
+        self._last_snapshot = time.monotonic()
+        self._stop_worker = False
         self.worker_task = asyncio.create_task(self._consumer_worker())
+        if ARCHIVE_INTERVAL > 0:
+            self.archiver_task = asyncio.create_task(self._archiver_worker())
+        self._start_memory_monitor()
+        self.accepting = True
         log.info("Consumer worker started.")
 
-    async def shutdown(self):
-        """Dipanggil oleh 'lifespan' untuk menghentikan worker."""
+    async def _initialize_replica(self):
+        """Replica: muat snapshot (state + offset change feed), lalu ikuti primary dari offset itu."""
+        snapshot = await asyncio.to_thread(self.snapshots.load)
+        async with self.lock:
+            if snapshot and "replica" in snapshot:
+                self.stats.update(snapshot["stats"])
+                self.topics_cache = snapshot["topics_cache"]
+                self.topic_counts = snapshot["topic_counts"]
+                self.replica.offset = snapshot["replica"]["offset"]
+                log.info(f"REPLICA: Snapshot dimuat, lanjut dari offset {self.replica.offset}.")
+            self.boot_id = uuid.uuid4().hex[:8]
+            self.response_cache.clear()
+            self._bump_versions(self.topics_cache)
+            self.memory.load(self.topics_cache)
+
+        self.db_ready = True
+        self.warmup_done.set()
+        self._last_snapshot = time.monotonic()
+        self.replica_task = asyncio.create_task(self.replica.run())
+        if ARCHIVE_INTERVAL > 0:
+            self.archiver_task = asyncio.create_task(self._archiver_worker())
+        self._start_memory_monitor()
+        log.info(f"REPLICA: Mengikuti primary {self.replica.primary_url} (read-only).")
+
+    async def _warm_up(self, cursor: float, boot_mark: float):
+        """
+        Me-replay HANYA delta sejak snapshot (atau seluruh DB jika tidak ada snapshot)
+        untuk melengkapi counter. Service sudah menerima event selama ini berjalan.
+        """
+        started = time.perf_counter()
+        replayed = 0
+        delta = {}
+        try:
+            async for topic, _, processed_at in self.store.iterate(since=cursor):
+                if processed_at > boot_mark:
+                    continue
+                delta[topic] = delta.get(topic, 0) + 1
+                replayed += 1
+
+            async with self.lock:
+                self.stats["unique_events"] += replayed
+                for topic, n in delta.items():
+                    self.topic_counts[topic] = self.topic_counts.get(topic, 0) + n
+                self._bump_versions()
+            self.warmup_done.set()
+            log.info(
+                f"LOAD STATE: Warm-up selesai dalam {time.perf_counter() - started:.2f}s, "
+                f"{replayed} key di-replay. Total {self.stats['unique_events']} event unik."
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Counter tidak lengkap: jangan pernah disimpan ke snapshot (cursor lama tetap
+            # berlaku, jadi boot berikutnya me-replay ulang dari sana) dan jangan report ready.
+            self.warmup_failed = True
+            log.error(f"LOAD STATE: Warm-up gagal: {e}", exc_info=True)
+
+    async def shutdown(self, drain_timeout: float = DRAIN_TIMEOUT):
+        """
+        Dipanggil oleh 'lifespan' (SIGTERM) untuk graceful shutdown:
+        1. Berhenti menerima publish baru.
+        2. Menghabiskan queue lewat jalur batch normal (dengan batas waktu).
+        3. Menghentikan worker, menyimpan snapshot terakhir, lalu menutup store.
+        """
+        self.accepting = False
+
+        if self.warmup_task:
+            # Warm-up yang belum selesai diulang saat boot berikutnya: warmup_done tidak
+            # di-set, jadi _save_snapshot() di bawah dilewati dan snapshot lama (beserta
+            # cursor-nya) tetap menjadi titik replay.
+            self.warmup_task.cancel()
+            try:
+                await self.warmup_task
+            except asyncio.CancelledError:
+                pass
+        for task in (self.archiver_task, self.replica_task, self.memory_task, self.evict_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+        if self.worker_task and not self.worker_task.done():
+            pending = self.queue.qsize()
+            log.info(f"Draining queue ({pending} event, timeout {drain_timeout}s)...")
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+                log.info("Queue kosong, semua event yang diterima sudah diproses.")
+            except asyncio.TimeoutError:
+                log.warning(f"Drain timeout: {self.queue.qsize()} event tidak sempat diproses.")
+
+        batch_done = True
         if self.worker_task:
+            # Cancel di tengah batch membuat writer thread tetap commit, tapi stats tidak pernah
+            # diperbarui -> tunggu batch yang sedang berjalan, lalu hentikan worker saat idle.
+            self._stop_worker = True
+            try:
+                await asyncio.wait_for(self._batch_idle.wait(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                batch_done = False
+                log.warning("Batch yang sedang diproses tidak selesai dalam batas waktu, worker dihentikan paksa.")
             self.worker_task.cancel()
             try:
                 await self.worker_task
             except asyncio.CancelledError:
                 log.info("Consumer worker stopped.")
+        self._fail_pending_acks("Aggregator shutdown sebelum event di-commit")
+        if self.snapshot_task:
+            await self.snapshot_task
+        if batch_done:
+            # Snapshot terakhir agar boot berikutnya tidak perlu replay
+            await self._save_snapshot()
+        else:
+            # Batch yang terputus bisa saja ter-commit setelah cursor snapshot baru ->
+            # snapshot lama tetap menjadi titik replay, jadi batch itu ikut di-replay.
+            log.warning("SNAPSHOT: Dilewati, ada batch yang terputus di tengah commit.")
+
+        await self.store.close()
+        if self.changelog is not None:
+            await asyncio.to_thread(self.changelog.close)
+        self.db_ready = False
+
+    # --- Health ---
+    def is_alive(self) -> bool:
+        """Liveness: consumer worker (atau follower, di replica) masih berjalan."""
+        task = self.replica_task if self.replica is not None else self.worker_task
+        return task is not None and not task.done()
+
+    def readiness(self) -> dict:
+        """Readiness: DB siap, warm-up selesai, queue masih punya ruang, dan masih menerima event."""
+        headroom_ok = self.queue.qsize() < self.queue.maxsize * READY_QUEUE_THRESHOLD
+        checks = {
+            "db": self.db_ready,
+            "warmup": self.warmup_done.is_set(),
+            "queue_headroom": headroom_ok,
+            "accepting": self.accepting,
+        }
+        if self.replica is not None:
+            # Replica tidak menerima publish; siap melayani baca setelah snapshot dimuat
+            checks = {"db": self.db_ready, "follower": self.is_alive()}
+            return {"ready": all(checks.values()), "checks": checks, "replication": self.replica.status()}
+        return {
+            "ready": all(checks.values()),
+            "checks": checks,
+            "warmup_failed": self.warmup_failed,
+            "queue_size": self.queue.qsize(),
+            "queue_maxsize": self.queue.maxsize,
+        }
 
     async def _consumer_worker(self):
         """
         Worker TUNGGAL yang berjalan di background.
         Ini adalah *satu-satunya* proses yang menyentuh database.
         """
-        while True:
+        while not self._stop_worker:
             try:
                 # 1. Menunggu event pertama (jika queue kosong)
                 first_event = await self.queue.get()
-                
+                self._batch_idle.clear()
+
                 # 2. Mengambil sisa batch (jika ada)
                 batch = [first_event]
                 batch_limit = 100 # Proses maks 100 event per transaksi
-                
+
                 # Ambil event dari queue sampai batch penuh atau queue kosong
                 while len(batch) < batch_limit and not self.queue.empty():
                     batch.append(self.queue.get_nowait())
-                    
+
                 # 3. Proses batch ini secara internal (menyentuh DB)
                 await self._process_batch_internal(batch)
-                
+
                 # 4. Tandai semua event di queue sebagai selesai
                 for _ in batch:
                     self.queue.task_done()
-                    
+
+                # 5. Snapshot berkala, diambil DI ANTARA batch: semua batch yang
+                #    sudah di-commit pasti sudah tercermin di stats/cache.
+                self._maybe_snapshot()
+
             except asyncio.CancelledError:
                 log.info("Consumer worker stopping...")
                 return
             except Exception as e:
                 log.error(f"Error di consumer worker: {e}", exc_info=True)
                 await asyncio.sleep(1)
+            finally:
+                self._batch_idle.set()
+
+    # --- Snapshot ---
+    def _snapshot_state(self) -> dict:
+        """
+        Menyalin state yang perlu disimpan. Dipanggil tanpa 'await' di tengahnya,
+        jadi konsisten terhadap consumer worker (single-threaded event loop).
+        Bagian sinkron ini memblokir event loop; cache dibatasi ke
+        SNAPSHOT_CACHE_PER_TOPIC event terbaru per topic agar biayanya terbatas.
+        """
+        limit = SNAPSHOT_CACHE_PER_TOPIC
+        state = {
+            # Semua key dengan processed_at <= cursor sudah tercermin di state ini
+            "cursor": time.time(),
+            "stats": {
+                "unique_events": self.stats["unique_events"],
+                "last_updated": self.stats["last_updated"],
+            },
+            "topic_counts": dict(self.topic_counts),
+            "topics_cache": {
+                topic: events[-limit:] if limit > 0 else list(events)
+                for topic, events in self.topics_cache.items()
+            },
+        }
+        if self.replica is not None:
+            # Replica: counter dari primary ikut disimpan, plus offset change feed yang
+            # sudah tercermin di state ini (titik lanjut setelah restart)
+            state["stats"] = dict(self.stats)
+            state["replica"] = {"offset": self.replica.offset}
+        return state
+
+    def _maybe_snapshot(self):
+        if SNAPSHOT_INTERVAL <= 0 or not self.warmup_done.is_set():
+            # Sebelum warm-up selesai, counter belum lengkap -> jangan disimpan
+            return
+        if self.snapshot_task and not self.snapshot_task.done():
+            return
+        if time.monotonic() - self._last_snapshot < SNAPSHOT_INTERVAL:
+            return
+        self._last_snapshot = time.monotonic()
+        state = self._snapshot_state()
+        self.snapshot_task = asyncio.create_task(self._write_snapshot(state))
+
+    async def _save_snapshot(self):
+        if not self.warmup_done.is_set():
+            log.warning("SNAPSHOT: Dilewati, warm-up belum selesai (counter belum lengkap).")
+            return
+        await self._write_snapshot(self._snapshot_state())
+
+    async def _write_snapshot(self, state: dict):
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.snapshots.save, state)
+            log.info(f"SNAPSHOT: Disimpan dalam {time.perf_counter() - started:.3f}s "
+                     f"({state['stats']['unique_events']} event unik).")
+        except Exception as e:
+            log.error(f"SNAPSHOT: Gagal menyimpan snapshot: {e}", exc_info=True)
 
     # --- API-facing methods (Sangat Cepat) ---
+    def _source_entry(self, source: str) -> dict:
+        entry = self.source_stats.get(source)
+        if entry is None:
+            entry = self.source_stats[source] = {"meter": RateMeter(), "accepted": 0, "rejected": 0}
+        return entry
+
+    def admit(self, events: list):
+        """
+        Admission control untuk satu request /publish.
+        Mengembalikan None jika diterima, atau detik 'Retry-After' jika ditolak (rate limit).
+        """
+        by_source, by_topic = {}, {}
+        for event in events:
+            source = event_source(event)
+            by_source[source] = by_source.get(source, 0) + 1
+            topic = event.get("topic", "unknown") if isinstance(event, dict) else "unknown"
+            by_topic[topic] = by_topic.get(topic, 0) + 1
+
+        retry_after = self.rate_limiter.try_acquire(by_source, by_topic) if self.rate_limiter.enabled else None
+        # Counter per source ikut tampil di /stats
+        self._bump_versions()
+        self._last_admit = time.time()
+        for source, n in by_source.items():
+            entry = self._source_entry(source)
+            if retry_after is None:
+                entry["accepted"] += n
+                entry["meter"].mark(n)
+            else:
+                entry["rejected"] += n
+        return retry_after
+
     async def queue_event(self, event: dict):
         """Dipanggil oleh /publish (single event)"""
         await self.queue.put(event)
 
-    async def queue_batch(self, events: list):
-        """Dipanggil oleh /publish (batch event)"""
+    async def queue_batch(self, events: list, wait: bool = False):
+        """
+        Dipanggil oleh /publish (batch event).
+        wait=True: baru kembali setelah semua event di-commit ke store (RuntimeError jika gagal).
+        """
+        ack = None
+        if wait:
+            ids = {id(event) for event in events}
+            ack = asyncio.get_running_loop().create_future()
+            entry = [len(ids), ack]
+            for event_id in ids:
+                self._acks[event_id] = entry
         for event in events:
             await self.queue.put(event)
+        if ack is not None:
+            await ack
+
+    def _resolve_acks(self, events: list, error: Exception = None):
+        for event in events:
+            entry = self._acks.pop(id(event), None)
+            if entry is None or entry[1].done():
+                continue
+            if error is not None:
+                entry[1].set_exception(error)
+                continue
+            entry[0] -= 1
+            if entry[0] == 0:
+                entry[1].set_result(None)
+
+    def _fail_pending_acks(self, reason: str):
+        """Event yang tidak akan pernah di-commit (drain timeout / reset): lepaskan request yang menunggu."""
+        for _, future in list(self._acks.values()):
+            if not future.done():
+                future.set_exception(RuntimeError(reason))
+        self._acks.clear()
 
     # --- Internal worker method (Lambat, DB-heavy) ---
     async def _process_batch_internal(self, events: list):
@@ -90,23 +488,38 @@ class Aggregator:
             return
 
         try:
-            # 1. Panggil DB (efisien)
-            new_events = await self.store.check_and_add_batch(events)
+            # Panggil DB (efisien). Key dedup (fingerprint hanya untuk topic yang dikonfigurasi)
+            # dihitung di thread storage dalam handoff yang sama, tidak memblokir event loop.
+            new_events = await self.store.check_and_add_batch(events, self.fingerprints)
         except Exception as e:
             log.error(f"Gagal memproses batch di DB: {e}", exc_info=True)
+            if self._acks:
+                self._resolve_acks(events, RuntimeError(f"Gagal commit ke store: {e}"))
             return
 
-        # 2. Hitung statistik
+        # 3. Hitung statistik
         num_received = len(events)
         num_new = len(new_events)
         num_dups = num_received - num_new
-        
-        # 3. Update statistik (in-memory)
+
+        # Hitungan per (topic, source) untuk time series; duplikat = yang tidak dikembalikan store
+        new_ids = {id(e) for e in new_events}
+        per_key = {}
+        for event in events:
+            key = (event.get("topic", "unknown"), event_source(event))
+            counts = per_key.get(key)
+            if counts is None:
+                counts = per_key[key] = [0, 0]
+            counts[0 if id(event) in new_ids else 1] += 1
+
+        # 4. Update statistik (in-memory)
         async with self.lock:
             self.stats["received_events"] += num_received
             self.stats["unique_events"] += num_new
             self.stats["duplicates"] += num_dups
-            
+            self.timeseries.record(per_key)
+
+            changed_topics = set()
             if num_new > 0:
                 self.stats["last_updated"] = datetime.now(timezone.utc).isoformat()
                 for event in new_events:
@@ -114,68 +527,365 @@ class Aggregator:
                     if topic not in self.topics_cache:
                         self.topics_cache[topic] = []
                     self.topics_cache[topic].append(event)
-    
+                    self.topic_counts[topic] = self.topic_counts.get(topic, 0) + 1
+                    self.memory.add(topic, event)
+                    changed_topics.add(topic)
+            self._bump_versions(changed_topics)
+        self._check_memory()
+
+        # 5. Change feed untuk replica, SETELAH commit ke store (urutan = urutan commit)
+        if self.changelog is not None:
+            record = {
+                "ts": time.time(),
+                "received": num_received,
+                "duplicates": num_dups,
+                "counts": [[topic, source, u, d] for (topic, source), (u, d) in per_key.items()],
+                "events": new_events,
+            }
+            try:
+                await asyncio.to_thread(self.changelog.append, record)
+            except Exception as e:
+                log.error(f"CHANGELOG: Gagal menulis record: {e}", exc_info=True)
+
+        # 6. Ack durable: batch ini sudah ada di store
+        if self._acks:
+            self._resolve_acks(events)
+
+    # --- Replikasi ---
+    async def read_changes(self, offset: int, limit: int) -> dict:
+        """Halaman change feed untuk GET /changes (primary)."""
+        records = await asyncio.to_thread(self.changelog.read, offset, limit)
+        return {
+            "offset": offset,
+            "next_offset": offset + len(records),
+            "head": self.changelog.head,
+            "changes": records,
+        }
+
+    async def _apply_changes(self, records: list):
+        """Replica: menerapkan record change feed ke state in-memory (dipanggil berurutan)."""
+        async with self.lock:
+            changed_topics = set()
+            for record in records:
+                self.stats["received_events"] += record["received"]
+                self.stats["duplicates"] += record["duplicates"]
+                self.stats["unique_events"] += len(record["events"])
+                self.timeseries.record({(t, s): [u, d] for t, s, u, d in record["counts"]}, now=record["ts"])
+                for event in record["events"]:
+                    topic = event.get("topic", "unknown")
+                    self.topics_cache.setdefault(topic, []).append(event)
+                    self.topic_counts[topic] = self.topic_counts.get(topic, 0) + 1
+                    self.memory.add(topic, event)
+                    changed_topics.add(topic)
+                if record["events"]:
+                    self.stats["last_updated"] = datetime.fromtimestamp(record["ts"], timezone.utc).isoformat()
+            self.replica.offset = records[-1]["offset"] + 1
+            self._bump_versions(changed_topics)
+        self._check_memory()
+        self._maybe_snapshot()
+
+    # --- Versi & response cache (ETag) ---
+    def _bump_versions(self, topics=()):
+        """Dipanggil setiap kali state berubah. Stats selalu berubah; /events hanya untuk 'topics'."""
+        self.stats_version += 1
+        if topics:
+            self.events_version += 1
+            for topic in topics:
+                self.topic_versions[topic] = self.topic_versions.get(topic, 0) + 1
+
+    def etag(self, key: tuple):
+        """
+        ETag resource saat ini, dihitung dari counter versi saja (tanpa lock, tanpa serialize).
+        boot_id membuat ETag dari proses/state sebelumnya tidak pernah cocok.
+        """
+        if key[0] == "events":
+            topic = key[1]
+            version = self.topic_versions.get(topic, 0) if topic else self.events_version
+            return f'"{self.boot_id}-e{version}"'
+        # events_per_sec meluruh walau tidak ada event baru: selama masih ada aktivitas
+        # di jendela RateMeter (RATE_WINDOW), ETag /stats ikut detik berjalan (maks. 1 serialize/detik).
+        now = time.time()
+        tick = int(now) if now - self._last_admit <= RATE_WINDOW else 0
+        return f'"{self.boot_id}-s{self.stats_version}.{tick}"'
+
+    async def cached_response(self, key: tuple, extra: dict = None) -> tuple:
+        """
+        (etag, bytes JSON) untuk ("events", topic) atau ("stats",).
+        Jika versi tidak berubah, bytes yang sudah di-serialize dipakai ulang tanpa
+        menyentuh lock; serialize ulang hanya setelah consumer mengubah resource itu.
+        """
+        etag = self.etag(key)
+        entry = self.response_cache.get(key)
+        if entry is not None and entry[0] == etag:
+            return entry
+        if key[0] == "events":
+            payload = await self.get_events(key[1])
+        else:
+            payload = await self.get_stats()
+            payload.update(extra or {})
+        # ETag diambil SEBELUM membaca state: jika ada perubahan di tengah jalan,
+        # entry ini langsung basi dan request berikutnya serialize ulang.
+        entry = (etag, json.dumps(payload, separators=(",", ":")).encode())
+        self.response_cache[key] = entry
+        return entry
+
     # --- Metode helper ---
     async def get_stats(self):
         async with self.lock:
             stats_copy = dict(self.stats)
             stats_copy["unique_topics"] = len(self.topics_cache)
-            return stats_copy
 
-    async def get_events(self, topic: str = None):
+        # Per publisher: laju event/detik (10 detik terakhir) dan porsi queue saat ini
+        queued = self.queue.qsize_by_source()
+        total_queued = self.queue.qsize()
+        stats_copy["sources"] = {
+            source: {
+                "events_per_sec": round(entry["meter"].rate(), 2),
+                "accepted": entry["accepted"],
+                "rejected": entry["rejected"],
+                "queued": queued.get(source, 0),
+                "queue_share": round(queued.get(source, 0) / total_queued, 4) if total_queued else 0.0,
+            }
+            for source, entry in self.source_stats.items()
+        }
+        if self.replica is not None:
+            stats_copy["replication"] = self.replica.status()
+        return stats_copy
+
+    async def get_timeseries(self, topic: str = None, source: str = None,
+                             resolution: str = "minute", window: int = 60) -> list:
+        async with self.lock:
+            return self.timeseries.query(topic, source, resolution, window)
+
+    async def get_events(self, topic: str = None, start: float = None, end: float = None):
+        """
+        Tanpa rentang waktu: event di tier panas (topics_cache) saja.
+        Dengan 'start'/'end' (epoch detik): gabungan tier panas + arsip untuk rentang itu,
+        diurutkan berdasarkan timestamp event. Hanya segmen arsip yang overlap yang dibaca.
+        """
+        if start is None and end is None:
+            async with self.lock:
+                if topic:
+                    return self.topics_cache.get(topic, [])
+                all_events = []
+                for ev_list in self.topics_cache.values():
+                    all_events.extend(ev_list)
+                return all_events
+
+        async with self.lock:
+            topics = [topic] if topic else list(self.topics_cache)
+            hot = []
+            for t in topics:
+                for event in self.topics_cache.get(t, []):
+                    ts = event_time(event)
+                    if ts is not None and (start is None or ts >= start) and (end is None or ts <= end):
+                        hot.append(event)
+
+        def read_archive():
+            names = [topic] if topic else self.archive.topics()
+            return [e for t in names for e in self.archive.read_range(t, start, end)]
+
+        archived = await asyncio.to_thread(read_archive)
+
+        # Crash di antara "tulis segmen" dan "hapus dari cache" bisa membuat event ada
+        # di kedua tier -> buang duplikatnya saat merge, dengan key dedup yang sama
+        # seperti store (event_id, atau fingerprint untuk topic yang dikonfigurasi).
+        candidates = archived + hot
+        keys = self.fingerprints.keys_for(candidates) or [e.get("event_id") for e in candidates]
+        merged, seen = [], set()
+        for event, dedup_key in zip(candidates, keys):
+            if dedup_key is None:
+                merged.append(event)
+                continue
+            key = (event.get("topic"), dedup_key)
+            if key not in seen:
+                seen.add(key)
+                merged.append(event)
+        merged.sort(key=event_time)
+        return merged
+
+    # --- Archiver (tier dingin) ---
+    async def _archiver_worker(self):
+        while True:
+            await asyncio.sleep(ARCHIVE_INTERVAL)
+            try:
+                await self.archive_old_events(time.time() - ARCHIVE_AFTER_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"ARSIP: Gagal mengarsipkan event lama: {e}", exc_info=True)
+
+    async def archive_old_events(self, cutoff: float) -> int:
+        """Memindah event dengan timestamp < cutoff dari topics_cache ke segmen arsip."""
+        async with self.lock:
+            old = {}
+            for topic, events in self.topics_cache.items():
+                # Event tanpa timestamp valid tetap di tier panas
+                picked = [e for e in events if (ts := event_time(e)) is not None and ts < cutoff]
+                if picked:
+                    old[topic] = picked
+        if not old:
+            return 0
+
+        # 1. Tulis segmen dulu (di thread), BARU hapus dari cache -> tidak ada event yang hilang
+        for topic, events in old.items():
+            await asyncio.to_thread(self.archive.write_segment, topic, events)
+
+        # 2. Hapus dari cache (by identity: cache hanya pernah di-append, jadi objeknya sama)
+        async with self.lock:
+            for topic, events in old.items():
+                archived_ids = {id(e) for e in events}
+                remaining = [e for e in self.topics_cache.get(topic, []) if id(e) not in archived_ids]
+                self.memory.remove(topic, len(self.topics_cache.get(topic, [])) - len(remaining))
+                self.topics_cache[topic] = remaining
+            self._bump_versions(old)
+
+        moved = sum(len(events) for events in old.values())
+        log.info(f"ARSIP: {moved} event dari {len(old)} topic dipindah ke arsip.")
+        return moved
+
+    # --- Memori ---
+    def memory_report(self) -> dict:
+        """
+        Estimasi memori per struktur (byte). Semua angka berasal dari counter incremental
+        atau konstanta per elemen; tidak ada traversal isi cache/queue.
+        """
+        mean_event = self.memory.mean_event_bytes()
+        topics = {
+            topic: {"events": len(events), "bytes": self.memory.topic_bytes(topic)}
+            for topic, events in self.topics_cache.items()
+        }
+        structures = {
+            "topics_cache": sum(t["bytes"] for t in topics.values()),
+            # Event di queue belum diukur satu per satu: jumlah x rata-rata ukuran event
+            "queue": int(self.queue.qsize() * (mean_event + POINTER_BYTES)),
+            "response_cache": sum(len(body) for _, body in self.response_cache.values()),
+            "timeseries": self.timeseries.nbytes(),
+            "changelog_index": self.changelog.head * 8 if self.changelog is not None else 0,
+        }
+        rss = rss_bytes()
+        return {
+            "estimated_bytes": sum(structures.values()),
+            "rss_bytes": rss,
+            "soft_limit_bytes": int(MEMORY_SOFT_LIMIT_MB * 1024 * 1024) or None,
+            "structures": structures,
+            "store": self.store.memory_usage() if self.db_ready and self.replica is None else {},
+            "mean_event_bytes": round(mean_event, 1),
+            "queue_events": self.queue.qsize(),
+            "topics": topics,
+            "tracemalloc": self.tracer.enabled,
+        }
+
+    async def memory_diff(self, top: int = 20) -> dict:
+        """Mode investigasi: diff alokasi tracemalloc sejak panggilan sebelumnya."""
+        return await asyncio.to_thread(self.tracer.diff, top)
+
+    def _start_memory_monitor(self):
+        if MEMORY_TRACEMALLOC:
+            self.tracer.start()
+        if MEMORY_LOG_INTERVAL > 0:
+            self.memory_task = asyncio.create_task(self._memory_monitor())
+
+    async def _memory_monitor(self):
+        while True:
+            await asyncio.sleep(MEMORY_LOG_INTERVAL)
+            report = self.memory_report()
+            mb = lambda n: f"{(n or 0) / 1048576:.1f}MB"
+            s = report["structures"]
+            log.info(
+                f"MEMORY: est {mb(report['estimated_bytes'])} (cache {mb(s['topics_cache'])}/{len(report['topics'])} topic, "
+                f"queue {mb(s['queue'])}/{report['queue_events']} event, response {mb(s['response_cache'])}, "
+                f"timeseries {mb(s['timeseries'])}), rss {mb(report['rss_bytes'])}"
+            )
+            self._check_memory()
+
+    def _check_memory(self):
+        """Dipanggil setelah setiap batch: perbandingan murah, eviction berjalan di task terpisah."""
+        if MEMORY_SOFT_LIMIT_MB <= 0 or (self.evict_task and not self.evict_task.done()):
+            return
+        # Jeda antar eviction agar cache yang tidak bisa dikurangi tidak memicu loop
+        if time.monotonic() - self._last_evict < 5:
+            return
+        limit = MEMORY_SOFT_LIMIT_MB * 1024 * 1024
+        if self._evictable_bytes() + self.queue.qsize() * self.memory.mean_event_bytes() > limit:
+            self._last_evict = time.monotonic()
+            self.evict_task = asyncio.create_task(self.evict_memory(int(limit * MEMORY_EVICT_TARGET)))
+
+    def _evictable_bytes(self) -> int:
+        return self.memory.cache_bytes() + sum(len(body) for _, body in self.response_cache.values())
+
+    async def evict_memory(self, target_bytes: int) -> int:
+        """
+        Soft limit terlampaui: kosongkan response cache, lalu arsipkan event tertua
+        (lintas topic) lebih awal sampai estimasi cache turun ke 'target_bytes'.
+        Mengembalikan jumlah event yang diarsipkan.
+        """
+        self.response_cache.clear()
+        excess = self._evictable_bytes() - target_bytes
+        if excess <= 0:
+            log.warning("MEMORY: Soft limit terlampaui, response cache dikosongkan.")
+            return 0
+
+        # Traversal hanya di sini (jarang): cari cutoff timestamp untuk k event tertua
+        k = math.ceil(excess / (self.memory.mean_event_bytes() + POINTER_BYTES))
         async with self.lock:
-            if topic:
-                return self.topics_cache.get(topic, [])
-            all_events = []
-            for ev_list in self.topics_cache.values():
-                all_events.extend(ev_list)
-            return all_events
-            
+            stamps = [ts for events in self.topics_cache.values() for e in events
+                      if (ts := event_time(e)) is not None]
+        if not stamps:
+            log.warning("MEMORY: Soft limit terlampaui tapi tidak ada event dengan timestamp untuk diarsipkan.")
+            return 0
+        stamps.sort()
+        cutoff = math.nextafter(stamps[min(k, len(stamps)) - 1], math.inf)
+        moved = await self.archive_old_events(cutoff)
+        log.warning(
+            f"MEMORY: Soft limit terlampaui, {moved} event tertua diarsipkan lebih awal "
+            f"(cache sekarang ~{self.memory.cache_bytes() / 1048576:.1f}MB)."
+        )
+        return moved
+
     async def reset_for_testing(self):
         """Membersihkan state untuk pytest."""
-        if self.worker_task:
-            self.worker_task.cancel()
-            try: await self.worker_task
-            except asyncio.CancelledError: pass
-        
-        while not self.queue.empty():
-            self.queue.get_nowait()
-            
+        for task in (self.warmup_task, self.archiver_task, self.worker_task, self.memory_task, self.evict_task):
+            if task:
+                task.cancel()
+                try: await task
+                except asyncio.CancelledError: pass
+        if self.snapshot_task:
+            await self.snapshot_task
+
+        self.queue.clear()
+        self._fail_pending_acks("reset")
+        self.source_stats.clear()
+        self.rate_limiter = RateLimiter()
+        self.fingerprints = FingerprintPolicy()
+
         async with self.lock:
             self.stats = {
                 "received_events": 0, "unique_events": 0,
                 "duplicates": 0, "last_updated": None,
             }
             self.topics_cache.clear()
-        
-        db_path = "data/dedup_store.db"
-        if os.path.exists(db_path):
-            os.remove(db_path)
-        
-        await self.initialize()
-        
-    # ... (di dalam class Aggregator) ...
+            self.topic_counts.clear()
+            self.timeseries.clear()
+            self.topic_versions.clear()
+            self.response_cache.clear()
+            self.memory.clear()
+        self._last_evict = 0.0
 
-    async def initialize(self):
-        """Dipanggil oleh 'lifespan' untuk inisialisasi DB DAN memulai worker."""
-        
-        # 1. Pastikan tabel ada (penting untuk langkah 2)
-        await self.store.init_db()
-        
-        # --- PERBAIKAN DI SINI ---
-        # 2. Hitung state dari DB yang persistent
-        initial_unique_count = await self.store.get_initial_unique_count()
-        
-        # 3. Set stats in-memory ke state yang ada di DB
-        async with self.lock:
-            # Set 'unique_events' ke hitungan yang ada di DB
-            self.stats["unique_events"] = initial_unique_count
-            
-            # Stats lain (received, duplicates) dimulai dari 0 untuk SESI INI.
-            # Ini adalah keputusan desain, tapi ini yang paling logis.
-            self.stats["received_events"] = 0
-            self.stats["duplicates"] = 0
-            
-        # 4. Memulai satu worker tunggal yang akan memproses queue
-        self.worker_task = asyncio.create_task(self._consumer_worker())
-        log.info("Consumer worker started.")
\ No newline at end of file
+        # Hapus storage milik backend yang aktif (file SQLite atau direktori LMDB)
+        await self.store.close()
+        db_path = self.store.path
+        if os.path.isdir(db_path):
+            shutil.rmtree(db_path)
+        else:
+            # Termasuk file -wal/-shm dari SQLite mode WAL
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+        self.snapshots.remove()
+        if self.changelog is not None:
+            await asyncio.to_thread(self.changelog.remove)
+        shutil.rmtree(self.archive.root, ignore_errors=True)
+        self.archive = ArchiveStore(self.archive.root)
+
+        await self.initialize()
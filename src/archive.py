@@ -0,0 +1,142 @@
+# src/archive.py
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import quote, unquote
+
+from .dedup_store import DB_DIR
+
+try:
+    import zstandard
+except ImportError:  # Opsional: tanpa zstandard, segmen dikompresi dengan gzip (stdlib)
+    zstandard = None
+
+log = logging.getLogger("uvicorn")
+
+ARCHIVE_DIR = os.path.join(DB_DIR, "archive")
+
+# Event dengan timestamp lebih tua dari ini (detik) dipindah dari cache ke arsip
+ARCHIVE_AFTER_SECONDS = float(os.getenv("ARCHIVE_AFTER_SECONDS", "3600"))
+
+# Seberapa sering archiver berjalan (detik). 0 = nonaktif.
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "60"))
+
+INDEX_FILE = "index.json"
+
+
+def event_time(event: dict):
+    """Timestamp event (epoch detik) dari field 'timestamp' ISO-8601, atau None jika tidak valid."""
+    value = event.get("timestamp") if isinstance(event, dict) else None
+    if not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _atomic_write(path: str, data: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ArchiveStore:
+    """
+    Tier dingin untuk event lama: file segmen immutable per topic.
+
+    Setiap segmen = NDJSON terkompresi (satu frame zstd, atau gzip jika 'zstandard'
+    tidak terpasang), diurutkan berdasarkan timestamp event. File sidecar 'index.json'
+    per topic menyimpan min/max timestamp tiap segmen, jadi query rentang waktu
+    hanya membuka segmen yang overlap.
+
+    Semua method sinkron; aggregator memanggilnya lewat asyncio.to_thread.
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR):
+        self.root = root
+        self._indexes = {}  # topic -> list metadata segmen (cache dari index.json)
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _topic_dir(self, topic: str) -> str:
+        return os.path.join(self.root, quote(topic, safe=""))
+
+    def _load_index(self, topic: str) -> list:
+        index = self._indexes.get(topic)
+        if index is None:
+            path = os.path.join(self._topic_dir(topic), INDEX_FILE)
+            index = []
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    index = json.load(f)
+            self._indexes[topic] = index
+        return index
+
+    def topics(self) -> list:
+        return [unquote(name) for name in os.listdir(self.root)
+                if os.path.isdir(os.path.join(self.root, name))]
+
+    def segments(self, topic: str) -> list:
+        with self._lock:
+            return list(self._load_index(topic))
+
+    def write_segment(self, topic: str, events: list) -> dict:
+        """Menulis satu segmen baru (immutable) lalu memperbarui index secara atomik."""
+        rows = sorted(((event_time(e), e) for e in events), key=lambda row: row[0])
+        payload = b"".join(json.dumps(e, separators=(",", ":")).encode() + b"\n" for _, e in rows)
+        if zstandard is not None:
+            data, ext = zstandard.ZstdCompressor(level=3).compress(payload), "zst"
+        else:
+            data, ext = gzip.compress(payload, compresslevel=6), "gz"
+
+        meta = {
+            "min_ts": rows[0][0],
+            "max_ts": rows[-1][0],
+            "count": len(rows),
+            "file": f"seg-{int(rows[0][0] * 1e6)}-{int(rows[-1][0] * 1e6)}-{time.time_ns()}.ndjson.{ext}",
+        }
+        topic_dir = self._topic_dir(topic)
+        os.makedirs(topic_dir, exist_ok=True)
+        _atomic_write(os.path.join(topic_dir, meta["file"]), data)
+
+        with self._lock:
+            index = self._load_index(topic) + [meta]
+            index.sort(key=lambda m: m["min_ts"])
+            _atomic_write(os.path.join(topic_dir, INDEX_FILE), json.dumps(index).encode())
+            self._indexes[topic] = index
+        return meta
+
+    def _read_segment(self, topic: str, meta: dict) -> list:
+        with open(os.path.join(self._topic_dir(topic), meta["file"]), "rb") as f:
+            data = f.read()
+        if meta["file"].endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError(f"Segmen {meta['file']} butuh package 'zstandard'")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            data = gzip.decompress(data)
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    def read_range(self, topic: str, start: float = None, end: float = None) -> list:
+        """Event arsip dengan start <= timestamp <= end, hanya dari segmen yang overlap."""
+        events = []
+        for meta in self.segments(topic):
+            if (start is not None and meta["max_ts"] < start) or (end is not None and meta["min_ts"] > end):
+                continue
+            for event in self._read_segment(topic, meta):
+                ts = event_time(event)
+                if (start is None or ts >= start) and (end is None or ts <= end):
+                    events.append(event)
+        return events
@@ -0,0 +1,104 @@
+# src/changelog.py
+
+import json
+import logging
+import os
+import threading
+from array import array
+
+from .dedup_store import DB_DIR
+
+log = logging.getLogger("uvicorn")
+
+# Change feed untuk replica: satu record per batch yang sudah di-commit ke dedup store
+CHANGELOG_PATH = os.path.join(DB_DIR, "changelog.ndjson")
+
+# Change feed hanya untuk primary yang punya replica: default NONAKTIF. Belum ada retensi,
+# jadi file ini menyimpan salinan kedua semua event unik dan tumbuh tanpa batas
+# (plus indeks posisi 8 byte per batch di memori).
+CHANGELOG_ENABLED = os.getenv("CHANGELOG_ENABLED", "0").lower() in ("1", "true", "yes")
+
+# Batas record per request GET /changes
+CHANGES_MAX_LIMIT = int(os.getenv("CHANGES_MAX_LIMIT", "1000"))
+
+
+class ChangeLog:
+    """
+    Log append-only (NDJSON) berisi perubahan yang sudah di-commit, berurutan.
+
+    Record ke-n punya offset n (mulai 0) dan berisi event unik baru dari satu batch
+    plus delta counter (received/duplicates dan hitungan per topic/source).
+    Posisi byte tiap record disimpan di array('q') di memori (8 byte per batch),
+    jadi baca dari offset mana pun = satu seek, tanpa scan.
+
+    Saat dibuka, file di-scan sekali untuk membangun ulang posisi; baris terakhir
+    yang terpotong (crash di tengah write) dibuang.
+
+    Tidak ada retensi/rotasi: replica selalu bisa mulai dari offset 0, tapi file dan
+    indeks posisi tumbuh terus selama change feed aktif.
+
+    Method sinkron; aggregator memanggilnya lewat asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = CHANGELOG_PATH):
+        self.path = path
+        self.positions = array("q")
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def head(self) -> int:
+        """Offset record berikutnya (= jumlah record)."""
+        return len(self.positions)
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        positions = array("q")
+        end = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    positions.append(end)
+                    end += len(line)
+            if end < os.path.getsize(self.path):
+                log.warning(f"CHANGELOG: Record terakhir terpotong, dibuang ({self.path}).")
+                os.truncate(self.path, end)
+        self.positions = positions
+        self._file = open(self.path, "ab")
+
+    def append(self, record: dict) -> int:
+        with self._lock:
+            offset = len(self.positions)
+            line = json.dumps({"offset": offset, **record}, separators=(",", ":")).encode() + b"\n"
+            position = self._file.tell()
+            self._file.write(line)
+            self._file.flush()
+            # Posisi baru dipublikasikan SETELAH record utuh ada di file
+            self.positions.append(position)
+            return offset
+
+    def read(self, offset: int, limit: int) -> list:
+        with self._lock:
+            head = len(self.positions)
+            if offset >= head:
+                return []
+            start = self.positions[offset]
+        records = []
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            for _ in range(min(limit, head - offset)):
+                records.append(json.loads(f.readline()))
+        return records
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.positions = array("q")
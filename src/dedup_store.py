@@ -1,121 +1,535 @@
 # src/dedup_store.py
 
-import aiosqlite
+import asyncio
+import hashlib
 import logging
 import os  # <-- Pastikan 'os' di-import
+import sys
+import time
+from abc import ABC, abstractmethod
 from datetime import datetime, timezone
 
+from .sqlite_worker import SQLiteWorker, SQLITE_CACHE_MB
+
 log = logging.getLogger("uvicorn")
 
 # --- PERUBAHAN KRUSIAL DIMULAI DI SINI ---
 
 # 1. Tentukan path absolut yang SAMA PERSIS dengan di docker-compose.yml
-DB_DIR = "/app/data" 
+#    (bisa dioverride lewat env DATA_DIR, mis. untuk pytest / benchmark)
+DB_DIR = os.getenv("DATA_DIR", "/app/data")
 
 # 2. Buat path lengkap ke file database
 DB_PATH = os.path.join(DB_DIR, "dedup_store.db")
 
 # --- PERUBAHAN KRUSIAL SELESAI ---
 
+# Backend dedup yang dipakai: "sqlite" (default) atau "lmdb"
+DEDUP_BACKEND = os.getenv("DEDUP_BACKEND", "sqlite")
+
+# Skema tabel untuk backend sqlite: "legacy" (default, tabel 'processed_events') atau "compact"
+SQLITE_SCHEMA = os.getenv("SQLITE_SCHEMA", "legacy").lower()
+
+
+def _ensure_parent_dir(path: str):
+    """Pastikan folder tempat file/direktori store ADA sebelum dibuka."""
+    parent = os.path.dirname(path) or "."
+    try:
+        os.makedirs(parent, exist_ok=True)
+        log.info(f"Folder persistensi {parent} dipastikan ada.")
+    except OSError as e:
+        log.error(f"GAGAL membuat direktori {parent}: {e}", exc_info=True)
+
+
+class DedupBackend(ABC):
+    """
+    Interface untuk semua backend dedup store.
+    Workload dedup hanya butuh cek keberadaan key (topic, event_id),
+    jadi interface ini sengaja kecil: batch check-and-add, count, expire, iterate.
+
+    Semua timestamp di interface ini adalah epoch detik (float, UTC).
+    """
+
+    path: str
+
+    @abstractmethod
+    async def init_db(self):
+        """Membuka/membuat storage. Dipanggil sekali saat startup."""
+
+    @abstractmethod
+    async def check_and_add_batch(self, events: list, policy=None) -> list:
+        """
+        Memeriksa dan menyimpan seluruh batch secara atomik.
+        'policy' (opsional, FingerprintPolicy) menentukan key dedup per event; key-nya
+        dihitung di thread storage, bukan di event loop.
+        Mengembalikan list event yang BARU (bukan duplikat), urutan dipertahankan.
+        Error storage DITERUSKAN ke pemanggil (bukan list kosong): batch yang gagal
+        tidak boleh terlihat seperti "semua duplikat".
+        """
+
+    @abstractmethod
+    async def count(self) -> int:
+        """Jumlah key unik yang tersimpan."""
+
+    @abstractmethod
+    async def expire(self, older_than: float) -> int:
+        """Menghapus key yang diproses sebelum 'older_than'. Mengembalikan jumlah yang dihapus."""
+
+    @abstractmethod
+    def iterate(self, since: float = None):
+        """
+        Async iterator atas (topic, event_id, processed_at).
+        Jika 'since' diberikan, hanya key dengan processed_at > since.
+        """
+
+    async def close(self):
+        """Menutup resource backend (default: tidak ada)."""
+
+    def memory_usage(self) -> dict:
+        """Estimasi/plafon memori milik backend dalam byte, untuk /admin/memory (default: kosong)."""
+        return {}
+
+
+def _to_iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def _now_us() -> int:
+    return time.time_ns() // 1000
+
+
+def _hash64(event_id: str) -> int:
+    """Hash 64-bit (signed, muat di INTEGER SQLite) dari event_id."""
+    return int.from_bytes(hashlib.blake2b(event_id.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+class DedupStore(DedupBackend):
+    """
+    Backend SQLite (tabel relasional 'processed_events').
+
+    Semua tulisan lewat SATU writer thread (satu handoff per batch),
+    query read-only lewat reader connection terpisah agar tidak antri di belakang writer.
+    """
 
-class DedupStore:
     def __init__(self, path: str = DB_PATH):
         """Konstruktor, sekarang menggunakan path absolut."""
         self.path = path
-        
+        self._writer = None
+        self._reader = None
+
         # --- PERUBAHAN PENTING ---
-        # 3. Pastikan direktori /app/data ADA sebelum mencoba menulis
-        #    Ini penting agar aiosqlite tidak gagal.
-        try:
-            os.makedirs(DB_DIR, exist_ok=True)
-            log.info(f"Folder persistensi {DB_DIR} dipastikan ada.")
-        except OSError as e:
-            log.error(f"GAGAL membuat direktori {DB_DIR}: {e}", exc_info=True)
+        # 3. Pastikan direktori data ADA sebelum mencoba menulis
+        #    Ini penting agar sqlite3 tidak gagal.
+        _ensure_parent_dir(self.path)
         # -------------------------
-            
+
         log.info(f"DedupStore akan menggunakan DB di: {self.path}")
 
 
     async def init_db(self):
-        """Memastikan database dan tabel sudah ada."""
+        """Memulai writer/reader thread dan memastikan tabel sudah ada."""
+        if self._writer is not None:
+            return
         try:
-            async with aiosqlite.connect(self.path) as db:
-                await db.execute("""
-                    CREATE TABLE IF NOT EXISTS processed_events (
-                        topic TEXT,
-                        event_id TEXT,
-                        processed_at TEXT,
-                        PRIMARY KEY (topic, event_id)
-                    )
-                """)
-                await db.commit()
+            self._writer = SQLiteWorker(self.path, name="dedup-writer")
+            await self._writer.start_async()
+            await self._writer.call(self._init_schema)
+
+            # Reader dibuka SETELAH tabel dibuat oleh writer
+            self._reader = SQLiteWorker(self.path, name="dedup-reader", readonly=True)
+            await self._reader.start_async()
             log.info(f"Database berhasil diinisialisasi di {self.path}")
         except Exception as e:
             log.error(f"GAGAL TOTAL inisialisasi database di {self.path}: {e}", exc_info=True)
+            await self.close()
             # Ini adalah error fatal, kita harus melemparnya lagi
             raise e
 
 
-    async def check_and_add_batch(self, events: list) -> list:
+    async def close(self):
+        """Menghentikan writer & reader thread (perintah yang sudah antri tetap diselesaikan)."""
+        for worker in (self._writer, self._reader):
+            if worker is not None and worker.is_alive():
+                await worker.stop()
+        self._writer = None
+        self._reader = None
+
+    def memory_usage(self) -> dict:
+        # Page cache terisi sesuai pemakaian, sampai plafon SQLITE_CACHE_MB per koneksi
+        connections = sum(1 for worker in (self._writer, self._reader) if worker is not None)
+        return {"sqlite_page_cache_max": connections * SQLITE_CACHE_MB * 1024 * 1024}
+
+
+    # --- Operasi sinkron (dijalankan di dalam SQLiteWorker) ---
+
+    @staticmethod
+    def _init_schema(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS processed_events (
+                topic TEXT,
+                event_id TEXT,
+                processed_at TEXT,
+                PRIMARY KEY (topic, event_id)
+            )
+        """)
+
+    @staticmethod
+    def _check_and_add_sync(conn, events: list, policy=None) -> list:
+        new_events = []
+        # Key dedup: event_id, atau fingerprint isi event jika topic-nya dikonfigurasi begitu
+        keys = policy.keys_for(events) if policy is not None else None
+        timestamp = datetime.now(timezone.utc).isoformat()
+
+        # Mulai transaksi manual
+        conn.execute("BEGIN")
+        try:
+            for i, event in enumerate(events):
+                topic = event.get("topic", "unknown")
+                event_id = keys[i] if keys is not None else event.get("event_id")
+                if not topic or not event_id:
+                    continue  # Lewati event yang tidak valid
+
+                # OR IGNORE: tidak ada exception per duplikat, cukup cek rowcount
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO processed_events (topic, event_id, processed_at) VALUES (?, ?, ?)",
+                    (topic, event_id, timestamp)
+                )
+                if cursor.rowcount == 1:
+                    # Berhasil INSERT, ini adalah event baru
+                    new_events.append(event)
+
+            # Commit transaksi
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return new_events
+
+    @staticmethod
+    def _expire_sync(conn, cutoff_iso: str) -> int:
+        cursor = conn.execute("DELETE FROM processed_events WHERE processed_at < ?", (cutoff_iso,))
+        return cursor.rowcount
+
+    @staticmethod
+    def _read_chunk(conn, after_rowid: int, since_iso: str):
+        query = "SELECT rowid, topic, event_id, processed_at FROM processed_events WHERE rowid > ?"
+        params = [after_rowid]
+        if since_iso is not None:
+            # processed_at disimpan sebagai ISO-8601 UTC, jadi perbandingan teks sudah benar
+            query += " AND processed_at > ?"
+            params.append(since_iso)
+        query += " ORDER BY rowid LIMIT 1000"
+        return conn.execute(query, params).fetchall()
+
+
+    # --- API async ---
+
+    async def check_and_add_batch(self, events: list, policy=None) -> list:
         """
         Memeriksa dan menyisipkan seluruh BATCH event dalam SATU TRANSAKSI.
-        Aman dan cepat untuk aiosqlite.
-        (Fungsi ini sudah benar, tidak perlu diubah)
+        Seluruh batch (termasuk hitung fingerprint) dikirim ke writer thread dalam SATU handoff.
         """
-        new_events = []
-        timestamp = datetime.now(timezone.utc).isoformat()
-        
-        async with aiosqlite.connect(self.path) as db:
+        try:
+            return await self._writer.call(self._check_and_add_sync, events, policy)
+        except Exception as e:
+            log.error(f"❌ Error saat memproses batch: {e}", exc_info=True)
+            raise
+
+
+    async def count(self) -> int:
+        row = await self._reader.call(
+            lambda conn: conn.execute("SELECT COUNT(event_id) FROM processed_events").fetchone()
+        )
+        return row[0] if row else 0
+
+
+    async def expire(self, older_than: float) -> int:
+        return await self._writer.call(self._expire_sync, _to_iso(older_than))
+
+
+    async def iterate(self, since: float = None):
+        since_iso = _to_iso(since) if since is not None else None
+        last_rowid = 0
+        while True:
+            rows = await self._reader.call(self._read_chunk, last_rowid, since_iso)
+            if not rows:
+                break
+            for rowid, topic, event_id, processed_at in rows:
+                last_rowid = rowid
+                yield topic, event_id, datetime.fromisoformat(processed_at).timestamp()
+
+
+class CompactDedupStore(DedupStore):
+    """
+    Backend SQLite dengan skema ringkas (SQLITE_SCHEMA=compact):
+
+    - 'topics': kamus topic -> id integer;
+    - 'dedup_keys': PRIMARY KEY (topic_id, hash 64-bit event_id) pada tabel WITHOUT ROWID,
+      jadi hanya ada SATU b-tree dan probe hanya membandingkan dua integer;
+    - event_id lengkap hanya disimpan untuk verifikasi collision hash
+      (collision asli masuk ke 'dedup_collisions');
+    - processed_at berupa epoch mikrodetik (integer), bukan string ISO.
+
+    Jika tabel lama 'processed_events' ada, isinya dimigrasikan ONLINE per chunk
+    lewat writer thread (berselang-seling dengan batch biasa); selama migrasi,
+    dedup juga mengecek tabel lama.
+    """
+
+    MIGRATION_CHUNK = 10_000
+
+    def __init__(self, path: str = DB_PATH):
+        super().__init__(path)
+        self._topic_ids = {}
+        self._migrated = None
+        self._migration_error = None
+        self._migrating = False
+        self._migrated_rowid = 0
+        self._migration_task = None
+
+    async def init_db(self):
+        if self._writer is not None:
+            return
+        await super().init_db()
+        self._migrated = asyncio.Event()
+        self._migrating = await self._writer.call(self._has_legacy_table)
+        if self._migrating:
+            self._migration_task = asyncio.create_task(self._migrate())
+        else:
+            self._migrated.set()
+
+    async def close(self):
+        if self._migration_task:
+            # Migrasi bisa dilanjutkan saat boot berikutnya (progress = isi tabel lama)
+            self._migration_task.cancel()
             try:
-                # Mulai transaksi manual
-                await db.execute("BEGIN")
-                
-                for event in events:
-                    topic = event.get("topic", "unknown")
-                    event_id = event.get("event_id")
-                    if not topic or not event_id:
-                        continue  # Lewati event yang tidak valid
-
-                    try:
-                        # Coba masukkan. Ini akan gagal jika PRIMARY KEY (topic, event_id) sudah ada.
-                        await db.execute(
-                            "INSERT INTO processed_events (topic, event_id, processed_at) VALUES (?, ?, ?)",
-                            (topic, event_id, timestamp)
-                        )
-                        # Jika berhasil, ini adalah event baru
-                        new_events.append(event)
-                    except aiosqlite.IntegrityError:
-                        # Event duplikat (PRIMARY KEY conflict), abaikan
-                        pass
-
-                # Commit transaksi
-                await db.commit()
-
-            except Exception as e:
-                await db.rollback()
-                log.error(f"❌ Error saat memproses batch: {e}", exc_info=True)
+                await self._migration_task
+            except asyncio.CancelledError:
+                pass
+            self._migration_task = None
+        self._topic_ids.clear()
+        await super().close()
+
+    def memory_usage(self) -> dict:
+        usage = super().memory_usage()
+        # Kamus topic -> id: dict + key string + int
+        usage["topic_ids"] = sys.getsizeof(self._topic_ids) + sum(sys.getsizeof(t) + 32 for t in self._topic_ids)
+        return usage
+
+    # --- Operasi sinkron (dijalankan di dalam SQLiteWorker) ---
 
+    @staticmethod
+    def _init_schema(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS topics (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dedup_keys (
+                topic_id INTEGER NOT NULL,
+                id_hash INTEGER NOT NULL,
+                event_id TEXT NOT NULL,
+                processed_at INTEGER NOT NULL,
+                PRIMARY KEY (topic_id, id_hash)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dedup_collisions (
+                topic_id INTEGER NOT NULL,
+                event_id TEXT NOT NULL,
+                processed_at INTEGER NOT NULL,
+                PRIMARY KEY (topic_id, event_id)
+            ) WITHOUT ROWID
+        """)
+
+    @staticmethod
+    def _has_legacy_table(conn) -> bool:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'processed_events'"
+        ).fetchone()
+        return row is not None
+
+    def _topic_id(self, conn, topic: str) -> int:
+        topic_id = self._topic_ids.get(topic)
+        if topic_id is None:
+            conn.execute("INSERT OR IGNORE INTO topics (name) VALUES (?)", (topic,))
+            topic_id = conn.execute("SELECT id FROM topics WHERE name = ?", (topic,)).fetchone()[0]
+            self._topic_ids[topic] = topic_id
+        return topic_id
+
+    def _insert_key(self, conn, topic: str, event_id: str, ts: int) -> bool:
+        """INSERT satu key ke skema ringkas. True jika key BARU."""
+        topic_id = self._topic_id(conn, topic)
+        id_hash = _hash64(event_id)
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO dedup_keys (topic_id, id_hash, event_id, processed_at) VALUES (?, ?, ?, ?)",
+            (topic_id, id_hash, event_id, ts)
+        )
+        if cursor.rowcount == 1:
+            return True
+        stored = conn.execute(
+            "SELECT event_id FROM dedup_keys WHERE topic_id = ? AND id_hash = ?", (topic_id, id_hash)
+        ).fetchone()[0]
+        if stored == event_id:
+            return False  # Duplikat asli
+        # Collision hash 64-bit (sangat jarang): simpan id lengkap di tabel terpisah
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO dedup_collisions (topic_id, event_id, processed_at) VALUES (?, ?, ?)",
+            (topic_id, event_id, ts)
+        )
+        return cursor.rowcount == 1
+
+    def _check_and_add_sync(self, conn, events: list, policy=None) -> list:
+        new_events = []
+        keys = policy.keys_for(events) if policy is not None else None
+        ts = _now_us()
+
+        conn.execute("BEGIN")
+        try:
+            for i, event in enumerate(events):
+                topic = event.get("topic", "unknown")
+                event_id = keys[i] if keys is not None else event.get("event_id")
+                if not topic or not event_id:
+                    continue  # Lewati event yang tidak valid
+                # Sama seperti afinitas TEXT di skema legacy: 123 dan "123" adalah key yang sama,
+                # dan satu event_id non-string tidak boleh menggagalkan seluruh batch
+                topic, event_id = str(topic), str(event_id)
+
+                if self._migrating and conn.execute(
+                    "SELECT 1 FROM processed_events WHERE topic = ? AND event_id = ?", (topic, event_id)
+                ).fetchone():
+                    continue  # Duplikat dari tabel lama yang belum dimigrasikan
+
+                if self._insert_key(conn, topic, event_id, ts):
+                    new_events.append(event)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            # Id topic baru mungkin ikut ter-rollback
+            self._topic_ids.clear()
+            raise
         return new_events
-    
-    
-    async def get_initial_unique_count(self) -> int:
-        """
-        Menghitung event unik yang sudah ada di DB saat startup.
-        Ini untuk memuat ulang state 'unique_events' yang persistent.
+
+    def _migrate_chunk(self, conn, after_rowid: int):
+        """Memindahkan satu chunk dari 'processed_events'. Mengembalikan rowid terakhir, atau None jika selesai."""
+        rows = conn.execute(
+            "SELECT rowid, topic, event_id, processed_at FROM processed_events"
+            " WHERE rowid > ? ORDER BY rowid LIMIT ?", (after_rowid, self.MIGRATION_CHUNK)
+        ).fetchall()
+        if not rows:
+            conn.execute("DROP TABLE processed_events")
+            # Dimatikan di thread writer yang sama dengan DROP: batch yang antre di belakang
+            # chunk ini tidak boleh lagi membaca tabel lama yang sudah dihapus
+            self._migrating = False
+            return None
+        conn.execute("BEGIN")
+        try:
+            for _, topic, event_id, processed_at in rows:
+                ts = int(datetime.fromisoformat(processed_at).timestamp() * 1_000_000)
+                self._insert_key(conn, topic, event_id, ts)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            self._topic_ids.clear()
+            raise
+        return rows[-1][0]
+
+    @staticmethod
+    def _expire_sync(conn, cutoff_us: int) -> int:
+        removed = conn.execute("DELETE FROM dedup_keys WHERE processed_at < ?", (cutoff_us,)).rowcount
+        removed += conn.execute("DELETE FROM dedup_collisions WHERE processed_at < ?", (cutoff_us,)).rowcount
+        return removed
+
+    @staticmethod
+    def _read_chunk(conn, after: tuple, since_us: int):
+        # Keyset pagination di atas PRIMARY KEY (tabel WITHOUT ROWID tidak punya rowid)
+        query = """
+            SELECT k.topic_id, k.id_hash, t.name, k.event_id, k.processed_at
+            FROM dedup_keys k JOIN topics t ON t.id = k.topic_id
+            WHERE (k.topic_id, k.id_hash) > (?, ?)
         """
-        count = 0
+        params = list(after)
+        if since_us is not None:
+            query += " AND k.processed_at > ?"
+            params.append(since_us)
+        query += " ORDER BY k.topic_id, k.id_hash LIMIT 1000"
+        return conn.execute(query, params).fetchall()
+
+    @staticmethod
+    def _read_collisions(conn, since_us: int):
+        return conn.execute(
+            "SELECT t.name, c.event_id, c.processed_at FROM dedup_collisions c"
+            " JOIN topics t ON t.id = c.topic_id WHERE c.processed_at > ?",
+            (since_us if since_us is not None else -1,)
+        ).fetchall()
+
+    # --- API async ---
+
+    async def _migrate(self):
+        started = time.perf_counter()
+        log.info(f"MIGRASI: Memindahkan 'processed_events' ke skema ringkas di {self.path}...")
         try:
-            # Kita tidak perlu init_db() di sini, karena kita asumsikan 
-            # itu sudah dipanggil oleh aggregator.
-            async with aiosqlite.connect(self.path) as db:
-                async with db.execute("SELECT COUNT(event_id) FROM processed_events") as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        count = row[0]
-            log.info(f"LOAD STATE: Berhasil memuat state. Ditemukan {count} event unik yang sudah ada.")
-            return count
+            while True:
+                last = await self._writer.call(self._migrate_chunk, self._migrated_rowid)
+                if last is None:
+                    break
+                self._migrated_rowid = last
+            self._migrated.set()
+            log.info(f"MIGRASI: Selesai dalam {time.perf_counter() - started:.2f}s.")
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            # Ini akan gagal jika file DB belum ada atau tabelnya belum dibuat
-            # Ini NORMAL pada run pertama.
-            log.warning(f"LOAD STATE: Tidak dapat memuat initial count (DB baru?): {e}")
-            return 0
\ No newline at end of file
+            # Dedup tetap benar (tabel lama masih dicek), tapi count/iterate/expire tidak bisa
+            # dijawab dari dua tabel yang sebagian tumpang tindih -> gagal (bukan menunggu selamanya),
+            # jadi warm-up ikut gagal dan terlihat di /readyz (warmup_failed).
+            log.error(f"MIGRASI: Gagal, tabel lama tetap dipakai untuk dedup: {e}", exc_info=True)
+            self._migration_error = e
+            self._migrated.set()
+
+    async def _wait_migrated(self):
+        await self._migrated.wait()
+        if self._migration_error is not None:
+            raise RuntimeError(f"Migrasi skema ringkas gagal: {self._migration_error}")
+
+    async def count(self) -> int:
+        # Selama migrasi, key yang sama bisa ada di dua tabel -> tunggu sampai selesai
+        await self._wait_migrated()
+        row = await self._reader.call(lambda conn: conn.execute(
+            "SELECT (SELECT COUNT(*) FROM dedup_keys) + (SELECT COUNT(*) FROM dedup_collisions)"
+        ).fetchone())
+        return row[0] if row else 0
+
+    async def expire(self, older_than: float) -> int:
+        await self._wait_migrated()
+        return await self._writer.call(self._expire_sync, int(older_than * 1_000_000))
+
+    async def iterate(self, since: float = None):
+        await self._wait_migrated()
+        since_us = int(since * 1_000_000) if since is not None else None
+        after = (0, 0)  # id topic dimulai dari 1
+        while True:
+            rows = await self._reader.call(self._read_chunk, after, since_us)
+            if not rows:
+                break
+            for topic_id, id_hash, topic, event_id, processed_at in rows:
+                after = (topic_id, id_hash)
+                yield topic, event_id, processed_at / 1_000_000
+        for topic, event_id, processed_at in await self._reader.call(self._read_collisions, since_us):
+            yield topic, event_id, processed_at / 1_000_000
+
+
+def create_dedup_store(backend: str = None, path: str = None) -> DedupBackend:
+    """Membuat dedup store sesuai konfigurasi (env DEDUP_BACKEND)."""
+    backend = (backend or DEDUP_BACKEND).lower()
+    if backend == "sqlite":
+        backend = "sqlite-compact" if SQLITE_SCHEMA == "compact" else "sqlite-legacy"
+    if backend == "sqlite-legacy":
+        return DedupStore(path or DB_PATH)
+    if backend == "sqlite-compact":
+        return CompactDedupStore(path or DB_PATH)
+    if backend == "lmdb":
+        # Import lazy: 'lmdb' adalah dependensi opsional
+        from .lmdb_store import LMDBDedupStore, LMDB_PATH
+        return LMDBDedupStore(path or LMDB_PATH)
+    raise ValueError(f"DEDUP_BACKEND tidak dikenal: {backend!r} (pilihan: sqlite, sqlite-legacy, sqlite-compact, lmdb)")
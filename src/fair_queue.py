@@ -0,0 +1,174 @@
+# src/fair_queue.py
+
+import asyncio
+import collections
+import os
+
+# Bobot per source untuk weighted fair queuing, format "sourceA=3,sourceB=1"
+SOURCE_WEIGHTS = os.getenv("SOURCE_WEIGHTS", "")
+
+# Maksimum event antri per source (default: setengah queue), 0 = tanpa batas per source
+QUEUE_MAX_PER_SOURCE = int(os.getenv("QUEUE_MAX_PER_SOURCE", "5000"))
+
+
+def parse_weights(spec: str) -> dict:
+    weights = {}
+    for part in spec.split(","):
+        if "=" in part:
+            key, value = part.split("=", 1)
+            weights[key.strip()] = max(1, int(value))
+    return weights
+
+
+def event_source(event) -> str:
+    if isinstance(event, dict):
+        return event.get("source") or "unknown"
+    return "unknown"
+
+
+class FairQueue:
+    """
+    Pengganti asyncio.Queue dengan antrian terpisah per 'source'.
+
+    - get(): weighted round-robin (deficit round robin) antar source, jadi satu
+      publisher yang membanjiri queue tidak membuat publisher lain menunggu di belakangnya.
+    - put(): menunggu jika total queue penuh ATAU antrian source itu sendiri sudah
+      mencapai 'per_source_maxsize', jadi source yang banjir hanya memblokir dirinya sendiri.
+
+    API-nya sama dengan asyncio.Queue yang dipakai consumer worker
+    (put/get/get_nowait/empty/qsize/maxsize/task_done/join).
+    """
+
+    def __init__(self, maxsize: int = 10000, per_source_maxsize: int = QUEUE_MAX_PER_SOURCE,
+                 weights: dict = None, key=event_source):
+        self.maxsize = maxsize
+        self.per_source_maxsize = per_source_maxsize or maxsize
+        self.weights = weights if weights is not None else parse_weights(SOURCE_WEIGHTS)
+        self.key = key
+
+        self._queues = {}                    # source -> deque event
+        self._ring = collections.deque()     # source yang punya event, urutan giliran
+        self._credit = {}                    # sisa jatah giliran source terdepan
+        self._size = 0
+
+        self._getters = collections.deque()
+        self._putters = collections.deque()
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    # --- Info ---
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def full(self) -> bool:
+        return self._size >= self.maxsize
+
+    def qsize_by_source(self) -> dict:
+        return {source: len(q) for source, q in self._queues.items()}
+
+    def _blocked(self, source: str) -> bool:
+        q = self._queues.get(source)
+        return self.full() or (q is not None and len(q) >= self.per_source_maxsize)
+
+    # --- Wakeup helper (pola yang sama dengan asyncio.Queue) ---
+    @staticmethod
+    def _wakeup_next(waiters):
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def _wakeup_all_putters(self):
+        # Putter menunggu dengan syarat berbeda (per source), jadi semua dibangunkan dan cek ulang
+        while self._putters:
+            waiter = self._putters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    # --- Put ---
+    def put_nowait(self, item):
+        source = self.key(item)
+        if self._blocked(source):
+            raise asyncio.QueueFull
+        q = self._queues.get(source)
+        if q is None:
+            q = self._queues[source] = collections.deque()
+        if not q:
+            self._ring.append(source)
+        q.append(item)
+        self._size += 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._wakeup_next(self._getters)
+
+    async def put(self, item):
+        source = self.key(item)
+        while self._blocked(source):
+            putter = asyncio.get_running_loop().create_future()
+            self._putters.append(putter)
+            try:
+                await putter
+            except BaseException:
+                putter.cancel()
+                raise
+        self.put_nowait(item)
+
+    # --- Get ---
+    def get_nowait(self):
+        if self._size == 0:
+            raise asyncio.QueueEmpty
+        source = self._ring[0]
+        if self._credit.get(source, 0) <= 0:
+            self._credit[source] = self.weights.get(source, 1)
+        q = self._queues[source]
+        item = q.popleft()
+        self._credit[source] -= 1
+        self._size -= 1
+
+        if not q:
+            # Source habis: keluar dari ring, hapus state-nya agar memori tidak bocor
+            self._ring.popleft()
+            del self._queues[source]
+            self._credit.pop(source, None)
+        elif self._credit[source] <= 0:
+            # Jatah giliran habis: pindah ke belakang
+            self._ring.rotate(-1)
+
+        self._wakeup_all_putters()
+        return item
+
+    async def get(self):
+        while self.empty():
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except BaseException:
+                getter.cancel()
+                if not self.empty() and not getter.cancelled():
+                    self._wakeup_next(self._getters)
+                raise
+        return self.get_nowait()
+
+    # --- Task tracking ---
+    def task_done(self):
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self):
+        if self._unfinished > 0:
+            await self._finished.wait()
+
+    def clear(self):
+        """Membuang semua isi queue (untuk reset pytest)."""
+        while not self.empty():
+            self.get_nowait()
+            self.task_done()
@@ -0,0 +1,107 @@
+# src/fingerprint.py
+
+import hashlib
+import json
+import os
+
+try:
+    import xxhash
+except ImportError:  # Opsional: tanpa xxhash dipakai blake2b (stdlib)
+    xxhash = None
+
+# Topic yang di-dedup berdasarkan isi event, bukan event_id.
+# Format: "topic=field1,field2;topic2=field" dengan field berupa path bertitik,
+# mis. "legacy.orders=source,payload.order_id,payload.amount"
+DEDUP_FINGERPRINT = os.getenv("DEDUP_FINGERPRINT", "")
+
+# Pemisah antar field saat kanonikalisasi
+_SEP = "\x1f"
+
+
+def parse_spec(spec: str) -> dict:
+    strategies = {}
+    for part in spec.split(";"):
+        if "=" in part:
+            topic, fields = part.split("=", 1)
+            strategies[topic.strip()] = [tuple(f.strip().split(".")) for f in fields.split(",") if f.strip()]
+    return strategies
+
+
+if xxhash is not None:
+    def hash64(data: bytes) -> str:
+        return xxhash.xxh3_64_hexdigest(data)
+else:
+    def hash64(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def _canonical(value) -> str:
+    """
+    Bentuk kanonik sebuah nilai. Nilai skalar (kasus umum) tidak lewat json.dumps
+    karena itu yang mendominasi biaya; dict/list di-serialize dengan key terurut.
+    Prefix tipe mencegah "1" (string) dan 1 (angka) menghasilkan fingerprint yang sama.
+    """
+    kind = type(value)
+    if kind is str:
+        return "s" + value
+    if kind is int or kind is float or kind is bool or value is None:
+        return "n" + repr(value)
+    return "j" + json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def compile_fingerprint(fields: list):
+    """
+    Fungsi fingerprint khusus untuk satu daftar field, dibuat SEKALI per topic saat config
+    di-parse. Getter tiap path di-generate sebagai kode lurus (tanpa loop per field/per
+    segmen path, tanpa panggilan helper untuk nilai skalar), lalu semua bagian di-join
+    dan di-hash SEKALI. Hasilnya identik dengan _canonical() per field.
+    """
+    lines = ["def fingerprint(event):"]
+    parts = []
+    for i, path in enumerate(fields):
+        lines.append("    v = event")
+        for name in path:
+            lines.append(f"    v = v.get({name!r}) if type(v) is dict else None")
+        lines.append("    t = type(v)")
+        lines.append(f"    p{i} = 's' + v if t is str else 'n' + repr(v) if t is int or t is float else canonical(v)")
+        parts.append(f"p{i}")
+    lines.append(f"    return 'fp:' + hash64(sep.join(({', '.join(parts)},)).encode())")
+    namespace = {"canonical": _canonical, "hash64": hash64, "sep": _SEP}
+    exec("\n".join(lines), namespace)
+    return namespace["fingerprint"]
+
+
+class FingerprintPolicy:
+    """
+    Strategi dedup per topic.
+
+    Default: key dedup = event_id. Untuk topic yang dikonfigurasi, key dedup =
+    "fp:" + hash non-kriptografis (xxh3 / blake2b 64-bit) dari field-field terpilih
+    yang dikanonikalisasi (JSON dengan key terurut), jadi publisher lama yang membuat
+    event_id baru setiap retry tetap ter-dedup.
+
+    keys_for() dipanggil oleh dedup store di thread writer-nya (bukan di event loop).
+    """
+
+    def __init__(self, spec: str = DEDUP_FINGERPRINT):
+        self.strategies = parse_spec(spec)
+        # topic -> fungsi fingerprint yang sudah di-compile
+        self._compiled = {topic: compile_fingerprint(fields) for topic, fields in self.strategies.items()}
+
+    def keys_for(self, events: list):
+        """
+        Key dedup untuk satu batch, atau None jika tidak ada topic fingerprint di batch ini
+        (fast path: store memakai event_id apa adanya).
+        """
+        compiled = self._compiled
+        if not compiled:
+            return None
+        keys = None
+        for i, event in enumerate(events):
+            fingerprint = compiled.get(event.get("topic", "unknown"))
+            if fingerprint is None:
+                continue
+            if keys is None:
+                keys = [e.get("event_id") for e in events]
+            keys[i] = fingerprint(event)
+        return keys
@@ -0,0 +1,180 @@
+# src/lmdb_store.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import struct
+import time
+
+from .dedup_store import DB_DIR, DedupBackend, _ensure_parent_dir
+
+try:
+    import lmdb
+except ImportError:  # Dependensi opsional, hanya dibutuhkan jika DEDUP_BACKEND=lmdb
+    lmdb = None
+
+log = logging.getLogger("uvicorn")
+
+# LMDB menyimpan datanya di sebuah DIREKTORI (data.mdb + lock.mdb)
+LMDB_PATH = os.path.join(DB_DIR, "dedup_store.lmdb")
+
+# Ukuran maksimum map (virtual). File di disk tetap hanya sebesar datanya.
+LMDB_MAP_SIZE = int(os.getenv("LMDB_MAP_SIZE", str(16 * 1024 ** 3)))
+
+# Value = processed_at (epoch detik, float64 big-endian)
+_TS = struct.Struct(">d")
+
+# Berapa key yang dibaca per handoff ke thread saat iterate()
+_ITER_CHUNK = 1000
+
+
+# Penanda event_id yang di-hash karena key lengkapnya melebihi batas key LMDB
+_HASHED_PREFIX = b"~blake2b:"
+
+
+def _encode_key(topic, event_id, max_size: int = 511):
+    """
+    Key LMDB untuk (topic, event_id), atau None jika tidak bisa disimpan.
+
+    Keduanya di-coerce dengan str() (123 dan "123" adalah key yang sama, seperti afinitas
+    TEXT di SQLite). LMDB menolak key > max_size byte: event_id yang terlalu panjang
+    diganti hash 128-bit-nya (topic tetap utuh untuk iterate/warm-up); jika topic-nya
+    sendiri sudah terlalu panjang, None (event dilewati, bukan seluruh batch gagal).
+    """
+    # NUL tidak mungkin muncul di topic dari JSON biasa, jadi aman sebagai separator
+    prefix = str(topic).encode() + b"\x00"
+    key = prefix + str(event_id).encode()
+    if len(key) <= max_size:
+        return key
+    key = prefix + _HASHED_PREFIX + hashlib.blake2b(key, digest_size=16).hexdigest().encode()
+    return key if len(key) <= max_size else None
+
+
+def _decode_key(key: bytes):
+    topic, _, event_id = key.partition(b"\x00")
+    return topic.decode(), event_id.decode()
+
+
+class LMDBDedupStore(DedupBackend):
+    """
+    Backend key-value embedded (LMDB).
+    Hanya menyimpan key -> processed_at, tanpa tabel relasional.
+    Semua operasi LMDB bersifat sinkron, jadi dijalankan lewat asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = LMDB_PATH, map_size: int = LMDB_MAP_SIZE):
+        if lmdb is None:
+            raise RuntimeError("DEDUP_BACKEND=lmdb membutuhkan package 'lmdb' (pip install lmdb)")
+        self.path = path
+        self.map_size = map_size
+        self.env = None
+        self.max_key_size = 511
+        _ensure_parent_dir(self.path)
+        log.info(f"LMDBDedupStore akan menggunakan DB di: {self.path}")
+
+    async def init_db(self):
+        if self.env is not None:
+            return
+        try:
+            self.env = await asyncio.to_thread(
+                lmdb.open, self.path, map_size=self.map_size, subdir=True,
+                max_dbs=0, writemap=True, metasync=False,
+            )
+            self.max_key_size = self.env.max_key_size()
+            log.info(f"Database LMDB berhasil diinisialisasi di {self.path}")
+        except Exception as e:
+            log.error(f"GAGAL TOTAL inisialisasi LMDB di {self.path}: {e}", exc_info=True)
+            raise e
+
+    async def close(self):
+        if self.env is not None:
+            env, self.env = self.env, None
+            await asyncio.to_thread(env.close)
+
+    def memory_usage(self) -> dict:
+        # LMDB memakai mmap: halaman ada di page cache OS (ikut RSS), bukan heap Python
+        try:
+            return {"lmdb_mapped_file": os.stat(os.path.join(self.path, "data.mdb")).st_blocks * 512}
+        except OSError:
+            return {}
+
+    # --- Operasi sinkron (dijalankan di thread) ---
+
+    def _check_and_add_sync(self, events: list, policy=None) -> list:
+        new_events = []
+        # Key dedup: event_id, atau fingerprint isi event jika topic-nya dikonfigurasi begitu
+        keys = policy.keys_for(events) if policy is not None else None
+        value = _TS.pack(time.time())
+        with self.env.begin(write=True) as txn:
+            for i, event in enumerate(events):
+                topic = event.get("topic", "unknown")
+                event_id = keys[i] if keys is not None else event.get("event_id")
+                if not topic or not event_id:
+                    continue  # Lewati event yang tidak valid
+                key = _encode_key(topic, event_id, self.max_key_size)
+                if key is None:
+                    log.warning(f"LMDB: Topic terlalu panjang untuk key LMDB, event dilewati: {str(topic)[:64]}...")
+                    continue
+                # overwrite=False -> put() mengembalikan False jika key sudah ada (duplikat)
+                if txn.put(key, value, overwrite=False):
+                    new_events.append(event)
+        return new_events
+
+    def _expire_sync(self, older_than: float) -> int:
+        removed = 0
+        with self.env.begin(write=True) as txn:
+            cursor = txn.cursor()
+            ok = cursor.first()
+            while ok:
+                if _TS.unpack(cursor.value())[0] < older_than:
+                    # delete() memindahkan cursor ke item berikutnya (key kosong = habis)
+                    cursor.delete()
+                    removed += 1
+                    ok = bool(cursor.key())
+                else:
+                    ok = cursor.next()
+        return removed
+
+    def _read_chunk(self, start_key: bytes, since: float):
+        rows = []
+        with self.env.begin() as txn:
+            cursor = txn.cursor()
+            ok = cursor.set_range(start_key) if start_key else cursor.first()
+            if ok and start_key and cursor.key() == start_key:
+                ok = cursor.next()  # start_key sudah dikirim di chunk sebelumnya
+            last_key = None
+            scanned = 0
+            while ok and scanned < _ITER_CHUNK:
+                scanned += 1
+                last_key = cursor.key()
+                ts = _TS.unpack(cursor.value())[0]
+                if since is None or ts > since:
+                    rows.append((*_decode_key(last_key), ts))
+                ok = cursor.next()
+        return rows, (last_key if ok else None)
+
+    # --- API async ---
+
+    async def check_and_add_batch(self, events: list, policy=None) -> list:
+        try:
+            return await asyncio.to_thread(self._check_and_add_sync, events, policy)
+        except Exception as e:
+            log.error(f"❌ Error saat memproses batch (LMDB): {e}", exc_info=True)
+            raise
+
+    async def count(self) -> int:
+        stat = await asyncio.to_thread(self.env.stat)
+        return stat["entries"]
+
+    async def expire(self, older_than: float) -> int:
+        return await asyncio.to_thread(self._expire_sync, older_than)
+
+    async def iterate(self, since: float = None):
+        key = b""
+        while True:
+            rows, key = await asyncio.to_thread(self._read_chunk, key, since)
+            for row in rows:
+                yield row
+            if key is None:
+                break
@@ -0,0 +1,155 @@
+# src/memory.py
+
+import logging
+import os
+import sys
+import tracemalloc
+
+log = logging.getLogger("uvicorn")
+
+# Batas lunak memori (MB) untuk struktur yang bisa di-evict (cache event panas + response cache).
+# Jika estimasi melewati batas ini, response cache dikosongkan lalu event tertua diarsipkan
+# lebih awal sampai turun ke MEMORY_EVICT_TARGET x batas. 0 = nonaktif.
+MEMORY_SOFT_LIMIT_MB = float(os.getenv("MEMORY_SOFT_LIMIT_MB", "0"))
+MEMORY_EVICT_TARGET = float(os.getenv("MEMORY_EVICT_TARGET", "0.8"))
+
+# Interval log ringkasan memori (detik). 0 = nonaktif.
+MEMORY_LOG_INTERVAL = float(os.getenv("MEMORY_LOG_INTERVAL", "60"))
+
+# Ukuran event diukur (sys.getsizeof rekursif) untuk 1 dari N event per topic;
+# sisanya memakai rata-rata sampel. 1 = ukur semua event.
+MEMORY_SAMPLE_EVERY = int(os.getenv("MEMORY_SAMPLE_EVERY", "16"))
+
+# Mode investigasi: tracemalloc aktif sejak startup, /admin/memory?tracemalloc=true
+# mengembalikan diff alokasi terhadap panggilan sebelumnya. Ada overhead CPU & memori.
+MEMORY_TRACEMALLOC = os.getenv("MEMORY_TRACEMALLOC", "0").lower() in ("1", "true", "yes")
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "1"))
+
+# Slot pointer per elemen di list/deque (CPython 64-bit)
+POINTER_BYTES = 8
+
+
+def approx_size(obj, getsizeof=sys.getsizeof) -> int:
+    """Estimasi ukuran objek JSON (dict/list/skalar) di heap, termasuk key dict."""
+    kind = type(obj)
+    if kind is dict:
+        size = getsizeof(obj)
+        for key, value in obj.items():
+            size += getsizeof(key)
+            t = type(value)
+            if t is str or t is int or t is float or t is bool or value is None:
+                size += getsizeof(value)
+            else:
+                size += approx_size(value)
+        return size
+    if kind is list or kind is tuple:
+        return getsizeof(obj) + sum([approx_size(v) for v in obj])
+    return getsizeof(obj)
+
+
+def rss_bytes():
+    """RSS proses saat ini dari /proc (Linux), atau None jika tidak tersedia."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryAccounting:
+    """
+    Estimasi byte cache event per topic, diperbarui incremental saat insert & evict.
+
+    Per topic disimpan [jumlah event, jumlah sampel, total byte sampel]. Hanya 1 dari
+    'sample_every' event yang diukur, jadi biaya per insert hampir konstan, dan tidak
+    pernah ada traversal penuh cache secara berkala.
+    """
+
+    def __init__(self, sample_every: int = MEMORY_SAMPLE_EVERY):
+        self.sample_every = max(1, sample_every)
+        self.topics = {}
+
+    def add(self, topic: str, event: dict):
+        entry = self.topics.get(topic)
+        if entry is None:
+            entry = self.topics[topic] = [0, 0, 0]
+        entry[0] += 1
+        if entry[0] % self.sample_every == 1 or self.sample_every == 1:
+            entry[1] += 1
+            entry[2] += approx_size(event)
+
+    def remove(self, topic: str, count: int):
+        entry = self.topics.get(topic)
+        if entry is not None:
+            entry[0] = max(0, entry[0] - count)
+
+    def load(self, topics_cache: dict):
+        """Mengukur ulang cache yang dimuat dari snapshot (sekali saat boot)."""
+        self.topics.clear()
+        for topic, events in topics_cache.items():
+            for event in events:
+                self.add(topic, event)
+
+    def clear(self):
+        self.topics.clear()
+
+    def topic_bytes(self, topic: str) -> int:
+        count, sampled, sampled_bytes = self.topics.get(topic, (0, 0, 0))
+        if not sampled:
+            return 0
+        return int(count * (sampled_bytes / sampled + POINTER_BYTES))
+
+    def mean_event_bytes(self) -> float:
+        sampled = sum(entry[1] for entry in self.topics.values())
+        if not sampled:
+            return 0.0
+        return sum(entry[2] for entry in self.topics.values()) / sampled
+
+    def cache_bytes(self) -> int:
+        return sum(self.topic_bytes(topic) for topic in self.topics)
+
+
+class TracemallocDiff:
+    """Snapshot tracemalloc; diff() membandingkan dengan snapshot sebelumnya (per baris kode)."""
+
+    def __init__(self, frames: int = MEMORY_TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self.baseline = None
+
+    @property
+    def enabled(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            log.warning("MEMORY: tracemalloc aktif (mode investigasi, ada overhead).")
+        self.baseline = tracemalloc.take_snapshot()
+
+    def diff(self, top: int = 20) -> dict:
+        """Sinkron dan relatif lambat; dipanggil lewat asyncio.to_thread."""
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        stats = snapshot.compare_to(self.baseline, "lineno") if self.baseline else snapshot.statistics("lineno")
+        self.baseline = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "top": [
+                {
+                    "where": str(stat.traceback),
+                    "size_bytes": stat.size,
+                    "size_diff_bytes": getattr(stat, "size_diff", stat.size),
+                    "count_diff": getattr(stat, "count_diff", stat.count),
+                }
+                for stat in stats[:top]
+            ],
+        }
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.baseline = None
@@ -0,0 +1,247 @@
+# src/publisher_client.py
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import deque
+
+import httpx
+
+from .rate_limiter import RateMeter
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # Opsional: tanpa 'h2' client memakai HTTP/1.1 keep-alive
+    h2 = None
+
+log = logging.getLogger("uvicorn")
+
+# Batch dikirim saat berisi sebanyak ini event...
+PUBLISH_BATCH_SIZE = int(os.getenv("PUBLISH_BATCH_SIZE", "500"))
+
+# ...atau saat event pertama di batch sudah menunggu selama ini (milidetik)
+PUBLISH_LINGER_MS = float(os.getenv("PUBLISH_LINGER_MS", "20"))
+
+# Body lebih kecil dari ini tidak dikompresi (gzip tidak sebanding untuk body kecil)
+PUBLISH_COMPRESS_MIN_BYTES = int(os.getenv("PUBLISH_COMPRESS_MIN_BYTES", "1024"))
+
+# Status yang layak di-retry: rate limit, shutdown/draining, error sementara di server
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class PublishError(Exception):
+    """Batch ditolak permanen (mis. 4xx selain 429) atau retry habis."""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class PublisherClient:
+    """
+    Client async untuk POST /publish.
+
+    - Satu httpx.AsyncClient (pool keep-alive, HTTP/2 jika 'h2' terpasang dan http2=True).
+    - publish() hanya menaruh event di buffer; buffer dikirim sebagai satu batch saat
+      penuh (batch_size) atau saat event tertua sudah menunggu 'linger' detik.
+    - Body JSON dikompresi gzip (Content-Encoding: gzip).
+    - Retry dengan exponential backoff + full jitter (menghormati Retry-After).
+      event_id di-set SEBELUM event masuk buffer, jadi setiap retry mengirim ulang
+      event_id yang sama: at-least-once, duplikat dibuang oleh dedup di server.
+    - durable=True: kirim ke /publish?wait=true, jadi batch baru dianggap terkirim setelah
+      di-commit ke dedup store. Tanpa itu 202 hanya berarti "masuk queue in-memory"
+      dan event bisa hilang jika server crash sesudahnya (tidak akan di-retry).
+    - metrics(): laju kirim dan latensi per batch (p50/p95/p99).
+    """
+
+    def __init__(self, base_url: str, batch_size: int = PUBLISH_BATCH_SIZE,
+                 linger: float = PUBLISH_LINGER_MS / 1000, compress: bool = True,
+                 http2: bool = False, max_in_flight: int = 4, max_retries: int = 8,
+                 backoff_base: float = 0.1, backoff_max: float = 10.0,
+                 timeout: float = 10.0, durable: bool = False,
+                 transport: httpx.AsyncBaseTransport = None):
+        if http2 and h2 is None:
+            log.warning("PublisherClient: package 'h2' tidak terpasang, memakai HTTP/1.1.")
+            http2 = False
+        self.http = httpx.AsyncClient(
+            base_url=base_url, http2=http2, timeout=timeout, transport=transport,
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+        )
+        self.batch_size = batch_size
+        self.linger = linger
+        self.compress = compress
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.params = {"wait": "true"} if durable else None
+
+        self._buffer = []     # list (event, future)
+        self._linger_task = None
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._send_tasks = set()
+
+        # Metrik
+        self._meter = RateMeter()
+        self._latencies = deque(maxlen=1024)  # detik per batch (termasuk retry)
+        self.counters = {"events_sent": 0, "batches_sent": 0, "retries": 0, "failed_events": 0, "bytes_sent": 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # --- API publik ---
+    async def publish(self, event: dict) -> asyncio.Future:
+        """
+        Menaruh satu event di buffer. Future yang dikembalikan selesai saat batch-nya
+        diterima server (202; dengan durable=True: sudah di-commit) atau gagal dengan
+        PublishError; boleh diabaikan.
+        """
+        if not event.get("event_id"):
+            event = {**event, "event_id": str(uuid.uuid4())}
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append((event, future))
+        if len(self._buffer) >= self.batch_size:
+            await self._dispatch()
+        elif self._linger_task is None:
+            self._linger_task = asyncio.create_task(self._linger())
+        return future
+
+    async def publish_many(self, events: list) -> list:
+        return [await self.publish(event) for event in events]
+
+    async def flush(self):
+        """Mengirim sisa buffer dan menunggu semua batch yang sedang dikirim."""
+        if self._buffer:
+            await self._dispatch()
+        while self._send_tasks:
+            await asyncio.gather(*list(self._send_tasks), return_exceptions=True)
+
+    async def close(self):
+        await self.flush()
+        await self.http.aclose()
+
+    async def wait_ready(self, timeout: float = None, interval: float = 1.0) -> bool:
+        """Polling /readyz lewat koneksi pool yang sama sampai aggregator siap."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if (await self.http.get("/readyz")).status_code == 200:
+                    return True
+            except httpx.TransportError:
+                pass
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(interval)
+
+    async def get_stats(self) -> dict:
+        resp = await self.http.get("/stats")
+        resp.raise_for_status()
+        return resp.json()
+
+    def metrics(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            **self.counters,
+            "events_per_sec": self._meter.rate(),
+            "buffered": len(self._buffer),
+            "in_flight_batches": len(self._send_tasks),
+            "latency_ms": {"p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99)},
+        }
+
+    # --- Internal ---
+    async def _linger(self):
+        try:
+            await asyncio.sleep(self.linger)
+        except asyncio.CancelledError:
+            return
+        self._linger_task = None
+        if self._buffer:
+            await self._dispatch()
+
+    async def _dispatch(self):
+        batch, self._buffer = self._buffer, []
+        if self._linger_task is not None and self._linger_task is not asyncio.current_task():
+            self._linger_task.cancel()
+        self._linger_task = None
+        # Backpressure: publish() menunggu di sini jika sudah max_in_flight batch di jalan
+        await self._in_flight.acquire()
+        task = asyncio.create_task(self._send(batch))
+        self._send_tasks.add(task)
+        task.add_done_callback(self._send_tasks.discard)
+
+    def _encode(self, events: list):
+        body = json.dumps({"events": events}, separators=(",", ":")).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.compress and len(body) >= PUBLISH_COMPRESS_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
+
+    def _backoff(self, attempt: int, retry_after: float = None) -> float:
+        # Full jitter: acak di [0, min(max, base * 2^attempt)] agar publisher tidak retry serentak
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def _send(self, batch: list):
+        try:
+            events = [event for event, _ in batch]
+            # Body di-encode sekali: setiap retry mengirim byte (dan event_id) yang sama persis
+            body, headers = self._encode(events)
+            t0 = time.perf_counter()
+            error = None
+            for attempt in range(self.max_retries + 1):
+                retry_after = None
+                try:
+                    resp = await self.http.post("/publish", content=body, headers=headers, params=self.params)
+                except httpx.TransportError as e:
+                    error = PublishError(f"Gagal mengirim batch: {e!r}")
+                else:
+                    if resp.status_code < 300:
+                        error = None
+                        break
+                    error = PublishError(f"Batch ditolak: HTTP {resp.status_code}", resp.status_code)
+                    if resp.status_code not in RETRY_STATUSES:
+                        break
+                    try:
+                        retry_after = float(resp.headers["Retry-After"])
+                    except (KeyError, ValueError):
+                        pass
+                if attempt < self.max_retries:
+                    self.counters["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt, retry_after))
+
+            self._latencies.append(time.perf_counter() - t0)
+            if error is None:
+                self.counters["events_sent"] += len(events)
+                self.counters["batches_sent"] += 1
+                self.counters["bytes_sent"] += len(body)
+                self._meter.mark(len(events))
+            else:
+                self.counters["failed_events"] += len(events)
+                log.warning(f"PublisherClient: {error} ({len(events)} event)")
+            for _, future in batch:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+                    # Caller boleh mengabaikan future; jangan sampai muncul "exception never retrieved"
+                    future.exception()
+        finally:
+            self._in_flight.release()
@@ -0,0 +1,110 @@
+# src/rate_limiter.py
+
+import os
+import time
+
+# Token bucket per 'source' (event/detik). 0 = nonaktif.
+RATE_LIMIT_PER_SOURCE = float(os.getenv("RATE_LIMIT_PER_SOURCE", "0"))
+# Token bucket per 'topic' (event/detik). 0 = nonaktif.
+RATE_LIMIT_PER_TOPIC = float(os.getenv("RATE_LIMIT_PER_TOPIC", "0"))
+# Kapasitas burst, dalam detik-rate (mis. 2.0 = boleh burst 2x rate per detik)
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "2"))
+
+# Panjang jendela default RateMeter (detik)
+RATE_WINDOW = 10
+
+
+class TokenBucket:
+    """Token bucket klasik: 'rate' token per detik, kapasitas maksimum 'burst'."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def available(self, n: int, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= n
+
+    def take(self, n: int):
+        self.tokens -= n
+
+    def retry_after(self, n: int) -> float:
+        """Detik sampai 'n' token tersedia (n > burst tidak akan pernah muat)."""
+        if n > self.burst:
+            return float("inf")
+        return max(0.0, (n - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """
+    Admission control di /publish, per 'source' (dan opsional per 'topic').
+    Satu request batch diterima utuh atau ditolak utuh (tidak ada batch setengah masuk).
+    """
+
+    def __init__(self, source_rate: float = RATE_LIMIT_PER_SOURCE,
+                 topic_rate: float = RATE_LIMIT_PER_TOPIC,
+                 burst_seconds: float = RATE_LIMIT_BURST_SECONDS):
+        self.source_rate = source_rate
+        self.topic_rate = topic_rate
+        self.burst_seconds = burst_seconds
+        self.source_buckets = {}
+        self.topic_buckets = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.source_rate > 0 or self.topic_rate > 0
+
+    def _bucket(self, buckets: dict, key: str, rate: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, max(1.0, rate * self.burst_seconds))
+        return bucket
+
+    def try_acquire(self, by_source: dict, by_topic: dict):
+        """
+        Mengambil token untuk semua source/topic di request ini secara atomik.
+        Mengembalikan None jika diterima, atau detik 'Retry-After' jika ditolak.
+        """
+        now = time.monotonic()
+        wanted = []
+        if self.source_rate > 0:
+            wanted += [(self._bucket(self.source_buckets, k, self.source_rate), n) for k, n in by_source.items()]
+        if self.topic_rate > 0:
+            wanted += [(self._bucket(self.topic_buckets, k, self.topic_rate), n) for k, n in by_topic.items()]
+
+        # Cek dulu SEMUA bucket, baru ambil token -> tidak ada token yang terbuang saat ditolak
+        blocked = [(bucket, n) for bucket, n in wanted if not bucket.available(n, now)]
+        if blocked:
+            return max(bucket.retry_after(n) for bucket, n in blocked)
+        for bucket, n in wanted:
+            bucket.take(n)
+        return None
+
+
+class RateMeter:
+    """Event per detik dalam jendela geser (bucket per detik), memori tetap."""
+
+    def __init__(self, window: int = RATE_WINDOW):
+        self.window = window
+        self.counts = [0] * window
+        self.seconds = [0] * window
+
+    def mark(self, n: int = 1, now: float = None):
+        second = int(now if now is not None else time.time())
+        slot = second % self.window
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.counts[slot] = 0
+        self.counts[slot] += n
+
+    def rate(self, now: float = None) -> float:
+        second = int(now if now is not None else time.time())
+        total = sum(c for c, s in zip(self.counts, self.seconds) if second - s < self.window)
+        return total / self.window
@@ -0,0 +1,79 @@
+# src/replication.py
+
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+
+log = logging.getLogger("uvicorn")
+
+# URL primary, mis. "http://localhost:8080". Jika di-set, instance berjalan sebagai replica read-only.
+REPLICA_OF = os.getenv("REPLICA_OF", "")
+
+# Jeda polling (detik) saat replica sudah menyusul primary
+REPLICA_POLL_INTERVAL = float(os.getenv("REPLICA_POLL_INTERVAL", "0.5"))
+
+# Record change feed per request
+REPLICA_FETCH_LIMIT = int(os.getenv("REPLICA_FETCH_LIMIT", "500"))
+
+
+class ReplicaFollower:
+    """
+    Mengikuti GET /changes milik primary dari 'offset' dan menerapkan setiap halaman
+    record lewat 'apply' (coroutine, dipanggil berurutan). 'apply' juga yang memajukan
+    'offset', di critical section yang sama dengan perubahan state: snapshot aggregator
+    selalu melihat pasangan (state, offset) yang konsisten, jadi setelah restart replica
+    melanjutkan tepat dari record berikutnya (tanpa hilang, tanpa dihitung dua kali).
+    """
+
+    def __init__(self, primary_url: str, apply, offset: int = 0,
+                 transport: httpx.AsyncBaseTransport = None):
+        self.primary_url = primary_url.rstrip("/")
+        self.apply = apply
+        self.offset = offset
+        self.transport = transport
+        self.primary_head = None
+        self.last_applied_ts = None   # waktu commit (di primary) record terakhir yang diterapkan
+        self.last_contact = None
+
+    async def run(self):
+        backoff = REPLICA_POLL_INTERVAL
+        async with httpx.AsyncClient(base_url=self.primary_url, timeout=10, transport=self.transport) as client:
+            while True:
+                try:
+                    resp = await client.get("/changes", params={"offset": self.offset, "limit": REPLICA_FETCH_LIMIT})
+                    resp.raise_for_status()
+                    page = resp.json()
+                except (httpx.HTTPError, ValueError) as e:
+                    log.warning(f"REPLICA: Gagal mengambil change feed dari {self.primary_url}: {e!r}")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+                backoff = REPLICA_POLL_INTERVAL
+                self.last_contact = time.time()
+                self.primary_head = page["head"]
+                if self.offset > self.primary_head:
+                    # Change feed primary lebih pendek dari offset kita (mis. DATA_DIR primary dihapus)
+                    log.error(f"REPLICA: Offset {self.offset} melewati head primary {self.primary_head}; menunggu.")
+                if page["changes"]:
+                    await self.apply(page["changes"])
+                    self.last_applied_ts = page["changes"][-1]["ts"]
+                if self.offset >= self.primary_head:
+                    await asyncio.sleep(REPLICA_POLL_INTERVAL)
+
+    def status(self) -> dict:
+        """Posisi & lag replikasi. lag_seconds = umur record terakhir yang diterapkan selama masih tertinggal."""
+        behind = None if self.primary_head is None else max(0, self.primary_head - self.offset)
+        lag_seconds = 0.0
+        if behind:
+            lag_seconds = None if self.last_applied_ts is None else round(time.time() - self.last_applied_ts, 3)
+        return {
+            "primary": self.primary_url,
+            "offset": self.offset,
+            "primary_head": self.primary_head,
+            "lag_records": behind,
+            "lag_seconds": lag_seconds,
+            "last_contact": self.last_contact,
+        }
@@ -0,0 +1,79 @@
+# src/sqlite_worker.py
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import queue
+import sqlite3
+import threading
+
+log = logging.getLogger("uvicorn")
+
+_STOP = object()
+
+# Page cache per koneksi (MB). Default SQLite hanya ~2 MB, terlalu kecil untuk
+# insert key acak (hash) ke b-tree besar.
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+
+
+class SQLiteWorker(threading.Thread):
+    """
+    Thread khusus yang memiliki SATU koneksi sqlite3 (stdlib).
+
+    Berbeda dengan aiosqlite (satu handoff + future per 'execute'), di sini
+    seluruh pekerjaan (mis. satu batch check-and-insert) dikirim sebagai SATU
+    fungsi sinkron, dijalankan di thread ini, dan hasilnya dikembalikan sekali.
+    """
+
+    def __init__(self, path: str, name: str, readonly: bool = False):
+        super().__init__(name=name, daemon=True)
+        self.path = path
+        self.readonly = readonly
+        self._commands = queue.Queue()
+        self._ready = concurrent.futures.Future()
+
+    def run(self):
+        try:
+            # isolation_level=None -> autocommit, transaksi dikelola manual (BEGIN/COMMIT)
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_MB * 1024}")
+            if self.readonly:
+                conn.execute("PRAGMA query_only = ON")
+            else:
+                # WAL: reader tidak pernah terblokir oleh writer (dan sebaliknya)
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute("PRAGMA synchronous = NORMAL")
+        except Exception as e:
+            self._ready.set_exception(e)
+            return
+        self._ready.set_result(None)
+
+        while True:
+            item = self._commands.get()
+            if item is _STOP:
+                break
+            fn, args, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(conn, *args))
+            except BaseException as e:
+                future.set_exception(e)
+        conn.close()
+
+    async def start_async(self):
+        """Memulai thread dan menunggu sampai koneksi terbuka."""
+        self.start()
+        await asyncio.wrap_future(self._ready)
+
+    async def call(self, fn, *args):
+        """Menjalankan fn(conn, *args) di thread ini (satu handoff per pemanggilan)."""
+        future = concurrent.futures.Future()
+        self._commands.put((fn, args, future))
+        return await asyncio.wrap_future(future)
+
+    async def stop(self):
+        """Menyelesaikan antrian perintah yang tersisa lalu menutup koneksi."""
+        self._commands.put(_STOP)
+        await asyncio.to_thread(self.join)
@@ -0,0 +1,130 @@
+# src/timeseries.py
+
+import logging
+import os
+import time
+from array import array
+from datetime import datetime, timezone
+
+# resolution -> (lebar bucket dalam detik, jumlah slot di ring)
+RESOLUTIONS = {
+    "minute": (60, 24 * 60),  # 24 jam terakhir per menit
+    "hour": (3600, 48),       # 48 jam terakhir per jam
+}
+
+# Batas jumlah key (topic, source) yang punya ring sendiri. Tiap key ~36 KB (ring menit + jam),
+# dan topic/source berasal dari client, jadi tanpa batas memori tumbuh per pasangan baru.
+# Key baru di atas batas digabung ke OVERFLOW_KEY. Memori maks. ~ batas x 36 KB.
+TIMESERIES_MAX_KEYS = int(os.getenv("TIMESERIES_MAX_KEYS", "1000"))
+
+# Key tempat semua pasangan (topic, source) di atas batas dijumlahkan
+OVERFLOW_KEY = ("_overflow", "_overflow")
+
+log = logging.getLogger("uvicorn")
+
+
+class RollingCounter:
+    """
+    Ring buffer berukuran tetap: satu slot per bucket waktu, berisi hitungan unik & duplikat.
+    Slot dipakai ulang saat waktu berputar (dicek lewat nomor bucket), jadi memori
+    tidak pernah bertambah dan tidak ada pekerjaan 'expire' terpisah.
+    """
+
+    __slots__ = ("width", "slots", "buckets", "unique", "duplicates")
+
+    def __init__(self, width: int, slots: int):
+        self.width = width
+        self.slots = slots
+        self.buckets = array("q", [-1]) * slots   # nomor bucket yang sedang menempati slot
+        self.unique = array("q", [0]) * slots
+        self.duplicates = array("q", [0]) * slots
+
+    def add(self, now: float, unique: int, duplicates: int):
+        bucket = int(now // self.width)
+        slot = bucket % self.slots
+        if self.buckets[slot] != bucket:
+            self.buckets[slot] = bucket
+            self.unique[slot] = 0
+            self.duplicates[slot] = 0
+        self.unique[slot] += unique
+        self.duplicates[slot] += duplicates
+
+    def read(self, bucket: int):
+        slot = bucket % self.slots
+        if self.buckets[slot] != bucket:
+            return 0, 0
+        return self.unique[slot], self.duplicates[slot]
+
+
+class TimeSeries:
+    """
+    Counter per (topic, source), tiap key punya ring per menit dan per jam.
+    Jumlah key dibatasi 'max_keys' (+ OVERFLOW_KEY), jadi memorinya benar-benar tetap.
+    """
+
+    def __init__(self, max_keys: int = TIMESERIES_MAX_KEYS):
+        self.max_keys = max_keys
+        self.series = {}
+        self.overflowed = False
+
+    def record(self, counts: dict, now: float = None):
+        """counts: {(topic, source): [unique, duplicates]} untuk satu batch."""
+        now = now if now is not None else time.time()
+        for key, (unique, duplicates) in counts.items():
+            rings = self.series.get(key)
+            if rings is None:
+                if len(self.series) >= self.max_keys:
+                    if not self.overflowed:
+                        self.overflowed = True
+                        log.warning(f"TIMESERIES: Batas {self.max_keys} key (topic, source) tercapai, "
+                                    f"key baru digabung ke {OVERFLOW_KEY}.")
+                    key = OVERFLOW_KEY
+                    rings = self.series.get(key)
+                if rings is None:
+                    rings = self.series[key] = {
+                        name: RollingCounter(width, slots) for name, (width, slots) in RESOLUTIONS.items()
+                    }
+            for ring in rings.values():
+                ring.add(now, unique, duplicates)
+
+    def query(self, topic: str = None, source: str = None, resolution: str = "minute",
+              window: int = 60, now: float = None) -> list:
+        """
+        'window' bucket terakhir (terlama dulu), dijumlahkan untuk semua key yang cocok.
+        Biaya O(jumlah key x window), tidak bergantung pada jumlah event.
+        """
+        width, slots = RESOLUTIONS[resolution]
+        if not 1 <= window <= slots:
+            raise ValueError(f"window untuk resolution '{resolution}' harus 1..{slots}")
+        now = now if now is not None else time.time()
+        last = int(now // width)
+        first = last - window + 1
+
+        unique = [0] * window
+        duplicates = [0] * window
+        for (t, s), rings in self.series.items():
+            if (topic is not None and t != topic) or (source is not None and s != source):
+                continue
+            ring = rings[resolution]
+            for i in range(window):
+                u, d = ring.read(first + i)
+                unique[i] += u
+                duplicates[i] += d
+
+        return [
+            {
+                "start": datetime.fromtimestamp((first + i) * width, timezone.utc).isoformat(),
+                "unique": unique[i],
+                "duplicates": duplicates[i],
+            }
+            for i in range(window)
+        ]
+
+    def nbytes(self) -> int:
+        """Memori ring buffer: ukurannya tetap per key, jadi cukup jumlah key x konstanta."""
+        per_key = sum(3 * 8 * slots for _, slots in RESOLUTIONS.values())
+        return len(self.series) * per_key
+
+    def clear(self):
+        self.series.clear()
+        self.overflowed = False
@@ -1,11 +1,7 @@
 # stress_test.py
 
-
-
 import asyncio
 
-import httpx
-
 import random
 
 import string
@@ -14,6 +10,10 @@ from datetime import datetime, timezone
 
 
 
+from src.publisher_client import PublisherClient
+
+
+
 SERVER_URL = "http://localhost:8080"
 
 TOTAL_EVENTS = 5000
@@ -86,81 +86,59 @@ def generate_events():
 
 
 
-async def send_batch(client, batch, idx):
-
-    try:
-
-        response = await client.post(f"{SERVER_URL}/publish", json={"events": batch})
-
-        if response.status_code != 202:
-
-            print(f"❌ Gagal batch {idx}: {response.status_code}")
-
-    except Exception as e:
-
-        print(f"❌ Error batch {idx}: {e}")
-
-
-
-
-
 async def run_test():
 
     print(f"Memulai stress test: {TOTAL_EVENTS} event ({DUPLICATE_RATIO*100:.1f}% duplikasi)...")
 
-
-
     all_events = generate_events()
 
 
 
-    async with httpx.AsyncClient(timeout=10) as client:
+    # Batching, kompresi, retry & batas concurrency (10 batch paralel) ditangani client
 
-        # Kirim batch secara paralel
+    async with PublisherClient(SERVER_URL, batch_size=BATCH_SIZE, max_in_flight=10) as client:
 
-        tasks = []
+        if not await client.wait_ready(timeout=MAX_WAIT_SEC):
 
-        for i in range(0, len(all_events), BATCH_SIZE):
+            print("❌ Aggregator tidak siap")
 
-            batch = all_events[i:i + BATCH_SIZE]
+            return
 
-            task = asyncio.create_task(send_batch(client, batch, i // BATCH_SIZE))
 
-            tasks.append(task)
 
-            if len(tasks) >= 10:  # batasi concurrency agar stabil
+        futures = await client.publish_many(all_events)
 
-                await asyncio.gather(*tasks)
+        await client.flush()
 
-                tasks.clear()
+        failed = sum(1 for f in futures if f.exception() is not None)
 
+        if failed:
 
+            print(f"❌ {failed} event gagal dikirim setelah retry")
 
-        # Tunggu batch terakhir
 
-        if tasks:
 
-            await asyncio.gather(*tasks)
+        metrics = client.metrics()
 
+        print(f"\nSelesai mengirim {TOTAL_EVENTS} event.")
 
+        print(f"  Batch: {metrics['batches_sent']}, retry: {metrics['retries']}, "
 
-    print(f"\nSelesai mengirim {TOTAL_EVENTS} event.")
+              f"latensi p50/p95/p99: {metrics['latency_ms']['p50']}/{metrics['latency_ms']['p95']}/{metrics['latency_ms']['p99']} ms")
 
-    print("Menunggu server memproses semua event (max 30 detik)...")
+        print("Menunggu server memproses semua event (max 30 detik)...")
 
 
 
-    # Polling ke endpoint /stats
+        # Polling ke endpoint /stats
 
-    async with httpx.AsyncClient(timeout=10) as client:
+        stats = {}
 
         for _ in range(MAX_WAIT_SEC):
 
             try:
 
-                r = await client.get(f"{SERVER_URL}/stats")
-
-                stats = r.json()
+                stats = await client.get_stats()
 
                 recv = stats.get("received_events", 0)
 
@@ -202,4 +180,4 @@ async def run_test():
 
 if __name__ == "__main__":
 
-    asyncio.run(run_test())
\ No newline at end of file
+    asyncio.run(run_test())
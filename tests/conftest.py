@@ -1,11 +1,32 @@
 # tests/conftest.py
 
+import os
+import tempfile
+import pytest
 import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
 
+# Jangan sentuh /app/data milik container: semua storage tes ke folder sementara.
+# Harus di-set SEBELUM 'main' di-import (path store dibaca saat import).
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="aggregator-test-"))
+# Change feed default nonaktif; tes replikasi butuh /changes di primary
+os.environ.setdefault("CHANGELOG_ENABLED", "1")
+
 # Import 'app' DAN 'aggregator' global dari main.py
 from main import app, aggregator
 
+def pytest_collection_modifyitems(items):
+    """
+    Satu event loop untuk seluruh sesi tes.
+    'aggregator' adalah objek global (queue & worker terikat ke satu loop),
+    jadi semua tes harus berjalan di loop yang sama. Fixture async ikut loop sesi
+    lewat 'asyncio_default_fixture_loop_scope' di pytest.ini.
+    """
+    session_loop = pytest.mark.asyncio(loop_scope="session")
+    for item in items:
+        if pytest_asyncio.is_async_test(item):
+            item.add_marker(session_loop, append=False)
+
 @pytest_asyncio.fixture(scope="function")
 async def client():
     """
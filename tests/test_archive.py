@@ -0,0 +1,44 @@
+# tests/test_archive.py
+
+from datetime import datetime, timezone
+
+from src.archive import ArchiveStore, event_time
+
+def _ev(event_id, ts):
+    iso = datetime.fromtimestamp(ts, timezone.utc).isoformat()
+    return {"topic": "arc", "event_id": event_id, "timestamp": iso, "source": "p", "payload": {}}
+
+def test_segments_indexed_by_time_range(tmp_path):
+    archive = ArchiveStore(str(tmp_path))
+    archive.write_segment("arc", [_ev("b", 200), _ev("a", 100)])
+    archive.write_segment("arc", [_ev("c", 1000), _ev("d", 1100)])
+
+    segments = archive.segments("arc")
+    assert [(m["min_ts"], m["max_ts"], m["count"]) for m in segments] == [(100, 200, 2), (1000, 1100, 2)]
+
+    # Index sidecar dibaca ulang dari disk oleh instance baru
+    assert ArchiveStore(str(tmp_path)).segments("arc") == segments
+    assert archive.topics() == ["arc"]
+
+def test_read_range_only_opens_overlapping_segments(tmp_path, monkeypatch):
+    archive = ArchiveStore(str(tmp_path))
+    archive.write_segment("arc", [_ev("a", 100), _ev("b", 200)])
+    archive.write_segment("arc", [_ev("c", 1000), _ev("d", 1100)])
+
+    opened = []
+    original = archive._read_segment
+    monkeypatch.setattr(archive, "_read_segment", lambda topic, meta: opened.append(meta["file"]) or original(topic, meta))
+
+    events = archive.read_range("arc", start=150, end=1050)
+    assert [e["event_id"] for e in events] == ["b", "c"]
+    assert len(opened) == 2
+
+    opened.clear()
+    assert [e["event_id"] for e in archive.read_range("arc", start=1050)] == ["d"]
+    assert len(opened) == 1
+
+def test_event_time():
+    assert event_time({"timestamp": "1970-01-01T00:01:40Z"}) == 100
+    assert event_time({"timestamp": "1970-01-01T00:01:40"}) == 100  # tanpa zona = UTC
+    assert event_time({"timestamp": "bukan waktu"}) is None
+    assert event_time({}) is None
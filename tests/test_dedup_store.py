@@ -0,0 +1,154 @@
+# tests/test_dedup_store.py
+
+import asyncio
+import os
+import time
+
+import pytest
+
+from src.dedup_store import create_dedup_store
+from src.fingerprint import FingerprintPolicy
+from src.lmdb_store import lmdb
+
+BACKENDS = [
+    "sqlite-legacy",
+    "sqlite-compact",
+    pytest.param("lmdb", marks=pytest.mark.skipif(lmdb is None, reason="package 'lmdb' tidak terpasang")),
+]
+
+def _ev(topic, event_id):
+    return {"topic": topic, "event_id": event_id, "source": "pytest", "payload": {}}
+
+@pytest.fixture(params=BACKENDS)
+async def store(request, tmp_path):
+    """Satu store baru per backend, di folder sementara."""
+    ext = "lmdb" if request.param == "lmdb" else "db"
+    s = create_dedup_store(request.param, os.path.join(tmp_path, f"dedup.{ext}"))
+    await s.init_db()
+    yield s
+    await s.close()
+
+async def test_check_and_add_batch(store):
+    """Event baru dikembalikan, duplikat (antar batch & dalam batch) dibuang."""
+    first = await store.check_and_add_batch([_ev("t", "a"), _ev("t", "b"), _ev("t", "a")])
+    assert [e["event_id"] for e in first] == ["a", "b"]
+
+    second = await store.check_and_add_batch([_ev("t", "b"), _ev("t", "c"), _ev("u", "a")])
+    assert [(e["topic"], e["event_id"]) for e in second] == [("t", "c"), ("u", "a")]
+    assert await store.count() == 4
+
+async def test_iterate_since_and_expire(store):
+    await store.check_and_add_batch([_ev("t", "old")])
+    time.sleep(0.01)
+    cutoff = time.time()
+    time.sleep(0.01)
+    await store.check_and_add_batch([_ev("t", "new")])
+
+    all_keys = sorted([(t, e) async for t, e, _ in store.iterate()])
+    assert all_keys == [("t", "new"), ("t", "old")]
+    assert [e async for _, e, _ in store.iterate(since=cutoff)] == ["new"]
+
+    assert await store.expire(cutoff) == 1
+    assert await store.count() == 1
+    # Key yang sudah di-expire dianggap baru lagi
+    assert len(await store.check_and_add_batch([_ev("t", "old")])) == 1
+
+async def test_fingerprint_policy_keys(store):
+    """Key fingerprint dihitung oleh store dari policy (di thread storage)."""
+    policy = FingerprintPolicy("orders=source,payload.order_id")
+    batch = [
+        {"topic": "orders", "event_id": "retry-1", "source": "pos", "payload": {"order_id": 1}},
+        {"topic": "orders", "event_id": "retry-2", "source": "pos", "payload": {"order_id": 1}},
+        {"topic": "orders", "source": "pos", "payload": {"order_id": 2}},
+        _ev("t", "a"),
+    ]
+    new = await store.check_and_add_batch(batch, policy)
+    assert [e.get("event_id") for e in new] == ["retry-1", None, "a"]
+    assert await store.check_and_add_batch(batch, policy) == []
+
+async def test_non_string_event_id(store):
+    """event_id numerik tidak menggagalkan batch, dan sama dengan bentuk string-nya."""
+    new = await store.check_and_add_batch([_ev("t", "ok-1"), _ev("t", 123), _ev("t", "ok-2")])
+    assert [e["event_id"] for e in new] == ["ok-1", 123, "ok-2"]
+    assert await store.check_and_add_batch([_ev("t", "123"), _ev("t", 123)]) == []
+    assert sorted([e async for _, e, _ in store.iterate()]) == ["123", "ok-1", "ok-2"]
+
+async def test_long_keys_do_not_fail_batch(store):
+    """event_id/topic sangat panjang (> batas key LMDB) tidak menggagalkan event lain di batch."""
+    long_id = "x" * 2000
+    batch = [_ev("t", "a"), _ev("t", long_id), _ev("t", long_id + "y"), _ev("t" * 2000, "b"), _ev("t", "c")]
+    new = await store.check_and_add_batch(batch)
+    assert [e["event_id"] for e in new if e["topic"] == "t"] == ["a", long_id, long_id + "y", "c"]
+    assert await store.check_and_add_batch([_ev("t", long_id)]) == []
+
+async def test_store_errors_are_raised(store):
+    """Error storage diteruskan, bukan list kosong (yang akan terbaca sebagai 'semua duplikat')."""
+    await store.close()
+    with pytest.raises(Exception):
+        await store.check_and_add_batch([_ev("t", "a")])
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_dedup_store("redis")
+
+@pytest.mark.parametrize("backend", ["sqlite-legacy", "sqlite-compact"])
+async def test_sqlite_creates_missing_data_dir(tmp_path, backend):
+    path = os.path.join(tmp_path, "nested", "data", "dedup.db")
+    store = create_dedup_store(backend, path)
+    await store.init_db()
+    assert len(await store.check_and_add_batch([_ev("t", "a")])) == 1
+    assert store.memory_usage()["sqlite_page_cache_max"] > 0
+    await store.close()
+
+async def test_online_migration_to_compact(tmp_path):
+    """Tabel lama dimigrasikan ke skema ringkas; dedup tetap benar selama & sesudah migrasi."""
+    path = os.path.join(tmp_path, "dedup.db")
+    legacy = create_dedup_store("sqlite-legacy", path)
+    await legacy.init_db()
+    await legacy.check_and_add_batch([_ev("t", f"old-{i}") for i in range(250)])
+    await legacy.close()
+
+    compact = create_dedup_store("sqlite-compact", path)
+    compact.MIGRATION_CHUNK = 100
+    await compact.init_db()
+    # Langsung setelah init (migrasi masih berjalan): key lama tetap terdeteksi duplikat
+    new = await compact.check_and_add_batch([_ev("t", "old-0"), _ev("t", "old-249"), _ev("t", "fresh")])
+    assert [e["event_id"] for e in new] == ["fresh"]
+
+    assert await compact.count() == 251  # menunggu migrasi selesai
+    assert not compact._migrating
+    assert await compact.check_and_add_batch([_ev("t", "old-100")]) == []
+    await compact.close()
+
+async def test_failed_migration_fails_instead_of_hanging(tmp_path, monkeypatch):
+    """Chunk migrasi gagal: count/iterate langsung error (warm-up gagal), dedup tetap benar."""
+    path = os.path.join(tmp_path, "dedup.db")
+    legacy = create_dedup_store("sqlite-legacy", path)
+    await legacy.init_db()
+    await legacy.check_and_add_batch([_ev("t", "old")])
+    await legacy.close()
+
+    def broken_chunk(self, conn, after_rowid):
+        raise OSError("disk error")
+
+    monkeypatch.setattr("src.dedup_store.CompactDedupStore._migrate_chunk", broken_chunk)
+    compact = create_dedup_store("sqlite-compact", path)
+    await compact.init_db()
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(compact.count(), timeout=2)
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(anext(compact.iterate()), timeout=2)
+    assert await compact.check_and_add_batch([_ev("t", "old")]) == []
+    await compact.close()
+
+async def test_compact_hash_collision(tmp_path, monkeypatch):
+    """Dua event_id berbeda dengan hash sama tetap dianggap dua event berbeda."""
+    monkeypatch.setattr("src.dedup_store._hash64", lambda event_id: 42)
+    store = create_dedup_store("sqlite-compact", os.path.join(tmp_path, "dedup.db"))
+    await store.init_db()
+
+    assert len(await store.check_and_add_batch([_ev("t", "a"), _ev("t", "b")])) == 2
+    assert await store.check_and_add_batch([_ev("t", "a"), _ev("t", "b")]) == []
+    assert await store.count() == 2
+    assert sorted([e async for _, e, _ in store.iterate()]) == ["a", "b"]
+    await store.close()
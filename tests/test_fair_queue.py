@@ -0,0 +1,56 @@
+# tests/test_fair_queue.py
+
+import asyncio
+
+import pytest
+
+from src.fair_queue import FairQueue
+
+def _ev(source, i):
+    return {"topic": "t", "event_id": f"{source}-{i}", "source": source}
+
+async def test_round_robin_between_sources():
+    """Event dari source yang banjir tidak menahan source lain di belakangnya."""
+    q = FairQueue(maxsize=100)
+    for i in range(10):
+        q.put_nowait(_ev("noisy", i))
+    q.put_nowait(_ev("polite", 0))
+
+    order = [q.get_nowait()["source"] for _ in range(3)]
+    assert order == ["noisy", "polite", "noisy"]
+
+async def test_weights():
+    q = FairQueue(maxsize=100, weights={"a": 3})
+    for i in range(6):
+        q.put_nowait(_ev("a", i))
+        q.put_nowait(_ev("b", i))
+
+    order = [q.get_nowait()["source"] for _ in range(8)]
+    assert order == ["a", "a", "a", "b", "a", "a", "a", "b"]
+
+async def test_per_source_cap_blocks_only_that_source():
+    q = FairQueue(maxsize=100, per_source_maxsize=2)
+    q.put_nowait(_ev("noisy", 0))
+    q.put_nowait(_ev("noisy", 1))
+    with pytest.raises(asyncio.QueueFull):
+        q.put_nowait(_ev("noisy", 2))
+    q.put_nowait(_ev("polite", 0))  # source lain tidak terpengaruh
+
+    blocked_put = asyncio.create_task(q.put(_ev("noisy", 2)))
+    await asyncio.sleep(0)
+    assert not blocked_put.done()
+
+    q.get_nowait()
+    await asyncio.wait_for(blocked_put, 1)
+    assert q.qsize_by_source() == {"noisy": 2, "polite": 1}
+
+async def test_join_waits_for_task_done():
+    q = FairQueue(maxsize=10)
+    q.put_nowait(_ev("a", 0))
+    joiner = asyncio.create_task(q.join())
+    await asyncio.sleep(0)
+    assert not joiner.done()
+
+    q.get_nowait()
+    q.task_done()
+    await asyncio.wait_for(joiner, 1)
@@ -0,0 +1,46 @@
+# tests/test_fingerprint.py
+
+from src.fingerprint import FingerprintPolicy, _SEP, _canonical, hash64
+
+def _ev(topic, event_id, source="legacy", **payload):
+    return {"topic": topic, "event_id": event_id, "source": source, "payload": payload}
+
+def test_no_strategy_is_fast_path():
+    assert FingerprintPolicy("").keys_for([_ev("t", "a")]) is None
+    assert FingerprintPolicy("other=source").keys_for([_ev("t", "a")]) is None
+
+def test_fingerprint_ignores_event_id_and_unselected_fields():
+    policy = FingerprintPolicy("orders=source,payload.order_id")
+    keys = policy.keys_for([
+        _ev("orders", "retry-1", order_id=7, note="x"),
+        _ev("orders", "retry-2", order_id=7, note="y"),
+        _ev("orders", "retry-3", order_id=8),
+        _ev("other", "plain-id"),
+    ])
+    assert keys[0] == keys[1]
+    assert keys[0].startswith("fp:")
+    assert keys[2] != keys[0]
+    assert keys[3] == "plain-id"  # topic lain tetap pakai event_id
+
+def test_fingerprint_is_canonical():
+    policy = FingerprintPolicy("orders=payload.item")
+    a = {"topic": "orders", "payload": {"item": {"sku": 1, "qty": 2}}}
+    b = {"topic": "orders", "payload": {"item": {"qty": 2, "sku": 1}}}
+    assert policy.keys_for([a]) == policy.keys_for([b])
+
+def test_compiled_fingerprint_matches_canonical_form():
+    """Fungsi per topic yang di-compile menghasilkan key yang sama dengan kanonikalisasi per field."""
+    policy = FingerprintPolicy("orders=source,payload.n,payload.x,payload.flag,payload.item,payload.missing,payload.n.deep")
+    payload = {"n": 7, "x": 1.5, "flag": True, "item": {"b": [1, "2"], "a": None}}
+    event = {"topic": "orders", "source": "pos", "payload": payload}
+    values = ["pos", 7, 1.5, True, payload["item"], None, None]
+    expected = "fp:" + hash64(_SEP.join(_canonical(v) for v in values).encode())
+    assert policy.keys_for([event]) == [expected]
+    # "1" (string) dan 1 (angka), serta True dan 1, tetap berbeda
+    keys = policy.keys_for([
+        {"topic": "orders", "source": "pos", "payload": {"n": "7"}},
+        {"topic": "orders", "source": "pos", "payload": {"n": 7}},
+        {"topic": "orders", "source": "pos", "payload": {"n": True}},
+        {"topic": "orders", "source": "pos", "payload": {"n": 1}},
+    ])
+    assert len(set(keys)) == 4
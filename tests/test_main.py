@@ -1,10 +1,12 @@
 # tests/test_main.py
 
 import asyncio
+import time
 from datetime import datetime, timezone
 
 # Catatan: Fixture 'client' otomatis di-inject dari conftest.py
 
+
 async def test_get_stats_initial(client):
     """Tes status awal (harus 0 semua)."""
     response = await client.get("/stats")
@@ -14,6 +16,7 @@ async def test_get_stats_initial(client):
     assert data["unique_events"] == 0
     assert data["duplicates"] == 0
 
+
 async def test_publish_single_event(client):
     """Tes 1 event baru."""
     event = {
@@ -36,6 +39,7 @@ async def test_publish_single_event(client):
     assert data["unique_events"] == 1
     assert data["duplicates"] == 0
 
+
 async def test_deduplication_logic(client):
     """
     Tes logika deduplikasi (1 unik, 2 duplikat).
@@ -63,6 +67,7 @@ async def test_deduplication_logic(client):
     assert data["unique_events"] == 1  # <-- HARUS 1
     assert data["duplicates"] == 2     # <-- HARUS 2
 
+
 async def test_publish_batch_events(client):
     """Tes 1 batch berisi 2 event unik."""
     events = {
@@ -90,6 +95,7 @@ async def test_publish_batch_events(client):
     assert data["received_events"] == 2  # <-- Tes ketat (==)
     assert data["unique_events"] == 2
 
+
 async def test_get_events_with_topic_filter(client):
     """Tes GET /events dan filter by topic."""
     ev1 = {"topic": "topic.a", "event_id": "ev-a1", "timestamp": datetime.now(timezone.utc).isoformat(), "source": "p", "payload": {}}
@@ -106,4 +112,360 @@ async def test_get_events_with_topic_filter(client):
     resp_filter = await client.get("/events?topic=topic.a")
     assert resp_filter.status_code == 200
     assert len(resp_filter.json()) == 1
-    assert resp_filter.json()[0]["event_id"] == "ev-a1"
\ No newline at end of file
+    assert resp_filter.json()[0]["event_id"] == "ev-a1"
+
+
+async def test_restart_restores_state_from_snapshot(client):
+    """Restart: state dimuat dari snapshot, lalu delta sejak snapshot di-replay dari DB."""
+    from main import aggregator
+
+    ev = {"topic": "snap.test", "event_id": "ev-snap-1", "timestamp": datetime.now(timezone.utc).isoformat(), "source": "p", "payload": {}}
+    await client.post("/publish", json=ev)
+    await asyncio.sleep(0.1)
+
+    # Shutdown menulis snapshot terakhir
+    await aggregator.shutdown()
+
+    # Simulasi key yang di-commit SETELAH snapshot (mis. crash sebelum snapshot berikutnya)
+    await aggregator.store.init_db()
+    await aggregator.store.check_and_add_batch([{"topic": "snap.test", "event_id": "ev-snap-2"}])
+
+    await aggregator.initialize()
+    await aggregator.warmup_done.wait()
+
+    data = (await client.get("/stats")).json()
+    assert data["unique_events"] == 2  # 1 dari snapshot + 1 dari replay delta
+    assert aggregator.topic_counts["snap.test"] == 2
+
+    # Cache event dari snapshot tersedia lagi setelah restart
+    resp = await client.get("/events?topic=snap.test")
+    assert [e["event_id"] for e in resp.json()] == ["ev-snap-1"]
+
+    # Dedup tetap berlaku untuk kedua key
+    await client.post("/publish", json=ev)
+    await asyncio.sleep(0.1)
+    assert (await client.get("/stats")).json()["duplicates"] == 1
+
+
+async def test_snapshot_keeps_only_recent_cache_window(client, monkeypatch):
+    """Snapshot hanya menyalin N event terbaru per topic; counter tetap lengkap."""
+    from main import aggregator
+
+    monkeypatch.setattr("src.aggregator.SNAPSHOT_CACHE_PER_TOPIC", 2)
+    now = datetime.now(timezone.utc).isoformat()
+    await client.post("/publish?wait=true", json={"events": [
+        {"topic": "snapwin.test", "event_id": f"ev-win-{i}", "timestamp": now, "source": "p", "payload": {}} for i in range(5)
+    ]})
+    await aggregator.shutdown()
+
+    state = aggregator.snapshots.load()
+    assert [e["event_id"] for e in state["topics_cache"]["snapwin.test"]] == ["ev-win-3", "ev-win-4"]
+    assert state["topic_counts"]["snapwin.test"] == 5
+    assert state["stats"]["unique_events"] == 5
+
+    await aggregator.initialize()
+    await aggregator.warmup_done.wait()
+
+
+async def test_health_and_readiness(client):
+    from main import aggregator
+
+    assert (await client.get("/healthz")).json() == {"status": "ok"}
+
+    await aggregator.warmup_done.wait()
+    resp = await client.get("/readyz")
+    assert resp.status_code == 200
+    assert resp.json()["ready"] is True
+
+
+async def test_unfinished_warmup_is_not_snapshotted(client):
+    """Warm-up yang dibatalkan/gagal tidak boleh menghasilkan snapshot berisi counter parsial."""
+    from main import aggregator
+
+    now = datetime.now(timezone.utc).isoformat()
+    await client.post("/publish?wait=true", json={"events": [
+        {"topic": "warm.test", "event_id": f"ev-warm-{i}", "timestamp": now, "source": "p", "payload": {}} for i in range(3)
+    ]})
+    await aggregator.shutdown()
+    # Boot berikutnya harus me-replay seluruh DB (tanpa snapshot)
+    aggregator.snapshots.remove()
+    real_iterate = aggregator.store.iterate
+
+    async def hanging_iterate(since=None):
+        await asyncio.Event().wait()
+        yield
+
+    async def failing_iterate(since=None):
+        raise RuntimeError("disk error")
+        yield
+
+    # 1. Shutdown di tengah warm-up: tidak ada snapshot yang ditulis
+    aggregator.store.iterate = hanging_iterate
+    await aggregator.initialize()
+    await asyncio.sleep(0.01)
+    await aggregator.shutdown()
+    assert aggregator.snapshots.load() is None
+
+    # 2. Warm-up gagal: tidak ready, dan tetap tanpa snapshot
+    aggregator.store.iterate = failing_iterate
+    await aggregator.initialize()
+    await asyncio.sleep(0.01)
+    resp = await client.get("/readyz")
+    assert resp.status_code == 503
+    assert resp.json()["warmup_failed"] is True
+    await aggregator.shutdown()
+    assert aggregator.snapshots.load() is None
+
+    # 3. Boot normal: replay penuh dari DB
+    aggregator.store.iterate = real_iterate
+    await aggregator.initialize()
+    await aggregator.warmup_done.wait()
+    assert (await client.get("/stats")).json()["unique_events"] == 3
+
+
+async def test_shutdown_drains_queue(client):
+    """Graceful shutdown: event yang sudah diterima di queue tetap diproses, publish baru ditolak."""
+    from main import aggregator
+
+    events = [
+        {"topic": "drain.test", "event_id": f"ev-drain-{i}", "timestamp": datetime.now(timezone.utc).isoformat(), "source": "p", "payload": {}}
+        for i in range(500)
+    ]
+    # Langsung ke queue (tanpa memberi worker kesempatan jalan) lalu shutdown
+    await aggregator.queue_batch(events)
+    await aggregator.shutdown()
+
+    assert aggregator.queue.empty()
+    assert aggregator.stats["unique_events"] == 500
+
+    resp = await client.post("/publish", json=events[0])
+    assert resp.status_code == 503
+    assert (await client.get("/readyz")).status_code == 503
+    assert (await client.get("/healthz")).status_code == 503
+
+
+async def test_shutdown_never_loses_in_flight_batch(client):
+    """Drain timeout saat batch sedang di-commit: setelah restart, stats tetap sama dengan isi store."""
+    from main import aggregator
+
+    real_check = aggregator.store._check_and_add_sync
+
+    def slow_check(conn, events, policy=None):
+        new_events = real_check(conn, events, policy)
+        time.sleep(0.5)  # writer thread lambat mengembalikan hasil (mis. fsync)
+        return new_events
+
+    aggregator.store._check_and_add_sync = slow_check
+    events = [
+        {"topic": "inflight.test", "event_id": f"ev-inflight-{i}", "timestamp": datetime.now(timezone.utc).isoformat(), "source": "p", "payload": {}}
+        for i in range(50)
+    ]
+    await aggregator.queue_batch(events)
+    await asyncio.sleep(0.05)  # worker sudah mengambil batch
+    await aggregator.shutdown(drain_timeout=0.1)
+    del aggregator.store._check_and_add_sync
+
+    await aggregator.initialize()
+    await aggregator.warmup_done.wait()
+    assert await aggregator.store.count() == 50
+    assert aggregator.stats["unique_events"] == 50
+
+
+async def test_rate_limit_per_source(client):
+    """Source yang melebihi token bucket ditolak (429), source lain tetap diterima."""
+    from main import aggregator
+    from src.rate_limiter import RateLimiter
+
+    aggregator.rate_limiter = RateLimiter(source_rate=5, topic_rate=0, burst_seconds=1)
+
+    def batch(source, n):
+        return {"events": [
+            {"topic": "rl.test", "event_id": f"{source}-{i}", "timestamp": datetime.now(timezone.utc).isoformat(), "source": source, "payload": {}}
+            for i in range(n)
+        ]}
+
+    assert (await client.post("/publish", json=batch("noisy", 5))).status_code == 202
+    resp = await client.post("/publish", json=batch("noisy", 5))
+    assert resp.status_code == 429
+    assert "retry-after" in resp.headers
+    assert (await client.post("/publish", json=batch("polite", 3))).status_code == 202
+
+    await asyncio.sleep(0.1)
+    sources = (await client.get("/stats")).json()["sources"]
+    assert sources["noisy"]["accepted"] == 5
+    assert sources["noisy"]["rejected"] == 5
+    assert sources["polite"]["accepted"] == 3
+    assert sources["polite"]["events_per_sec"] > 0
+
+
+async def test_events_time_range_merges_archive(client):
+    """Event lama dipindah ke arsip; query rentang waktu menggabungkan arsip + cache."""
+    from main import aggregator
+
+    def ev(event_id, ts):
+        iso = datetime.fromtimestamp(ts, timezone.utc).isoformat()
+        return {"topic": "tier.test", "event_id": event_id, "timestamp": iso, "source": "p", "payload": {}}
+
+    now = datetime.now(timezone.utc).timestamp()
+    await client.post("/publish", json={"events": [ev("old-1", now - 7200), ev("old-2", now - 5400), ev("new-1", now)]})
+    await asyncio.sleep(0.1)
+
+    assert await aggregator.archive_old_events(now - 3600) == 2
+    # Tanpa rentang waktu: hanya tier panas
+    assert [e["event_id"] for e in (await client.get("/events?topic=tier.test")).json()] == ["new-1"]
+
+    resp = await client.get("/events", params={"topic": "tier.test", "start": now - 8000, "end": now + 1})
+    assert [e["event_id"] for e in resp.json()] == ["old-1", "old-2", "new-1"]
+
+    start_iso = datetime.fromtimestamp(now - 6000, timezone.utc).isoformat()
+    resp = await client.get("/events", params={"start": start_iso})
+    assert [e["event_id"] for e in resp.json()] == ["old-2", "new-1"]
+
+    assert (await client.get("/events", params={"start": "kemarin"})).status_code == 400
+
+
+async def test_stats_timeseries(client):
+    ev = {"topic": "ts.test", "event_id": "ev-ts-1", "timestamp": datetime.now(timezone.utc).isoformat(), "source": "pytest", "payload": {}}
+    await client.post("/publish", json=ev)
+    await client.post("/publish", json=ev)
+    await asyncio.sleep(0.1)
+
+    resp = await client.get("/stats/timeseries", params={"topic": "ts.test", "window": 5})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["bucket_seconds"] == 60
+    assert len(data["buckets"]) == 5
+    # Dijumlah: batch bisa saja jatuh tepat di pergantian menit
+    assert sum(b["unique"] for b in data["buckets"]) == 1
+    assert sum(b["duplicates"] for b in data["buckets"]) == 1
+
+    other = (await client.get("/stats/timeseries", params={"source": "lain", "window": 1})).json()
+    assert other["buckets"][0]["unique"] == 0
+
+    assert (await client.get("/stats/timeseries", params={"resolution": "day"})).status_code == 400
+
+
+async def test_fingerprint_dedup_for_regenerated_ids(client):
+    """Publisher lama yang membuat event_id baru saat retry tetap ter-dedup lewat fingerprint."""
+    from main import aggregator
+    from src.fingerprint import FingerprintPolicy
+
+    aggregator.fingerprints = FingerprintPolicy("legacy.orders=source,payload.order_id")
+
+    def ev(event_id, order_id):
+        return {"topic": "legacy.orders", "event_id": event_id, "timestamp": datetime.now(timezone.utc).isoformat(), "source": "old-pos", "payload": {"order_id": order_id}}
+
+    no_id = ev(None, 2)
+    del no_id["event_id"]
+    await client.post("/publish", json={"events": [ev("try-1", 1), ev("try-2", 1), no_id, ev("try-3", 2)]})
+    await asyncio.sleep(0.1)
+
+    data = (await client.get("/stats")).json()
+    assert data["unique_events"] == 2
+    assert data["duplicates"] == 2
+    # Event asli (dengan event_id aslinya) yang disimpan di cache
+    events = (await client.get("/events?topic=legacy.orders")).json()
+    assert [e["payload"]["order_id"] for e in events] == [1, 2]
+
+    # Rentang waktu (arsip + cache): event fingerprint tanpa event_id tidak saling menimpa
+    third = ev(None, 3)
+    del third["event_id"]
+    await client.post("/publish", json=third)
+    await asyncio.sleep(0.1)
+    now = datetime.now(timezone.utc).timestamp()
+    resp = await client.get("/events", params={"topic": "legacy.orders", "start": now - 60})
+    assert sorted(e["payload"]["order_id"] for e in resp.json()) == [1, 2, 3]
+
+
+async def test_etag_conditional_get(client):
+    """Polling tanpa perubahan -> 304; event baru di topic -> ETag berubah."""
+    first = await client.get("/events?topic=etag.test")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.json() == []
+
+    again = await client.get("/events?topic=etag.test", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+    # Event di topic lain tidak mengubah ETag topic ini
+    await client.post("/publish", json={"topic": "etag.other", "event_id": "ev-etag-0", "timestamp": datetime.now(timezone.utc).isoformat(), "source": "pytest", "payload": {}})
+    await asyncio.sleep(0.1)
+    assert (await client.get("/events?topic=etag.test", headers={"If-None-Match": etag})).status_code == 304
+
+    await client.post("/publish", json={"topic": "etag.test", "event_id": "ev-etag-1", "timestamp": datetime.now(timezone.utc).isoformat(), "source": "pytest", "payload": {}})
+    await asyncio.sleep(0.1)
+    changed = await client.get("/events?topic=etag.test", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [e["event_id"] for e in changed.json()] == ["ev-etag-1"]
+
+    stats = await client.get("/stats")
+    assert stats.json()["unique_events"] == 2
+    assert stats.headers["etag"]
+
+
+async def test_admin_memory_and_soft_limit_eviction(client):
+    """Estimasi byte per topic bertambah saat insert, berkurang saat event di-evict ke arsip."""
+    from main import aggregator
+
+    old = datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp()
+    events = [{"topic": "mem.test", "event_id": f"ev-mem-{i}", "timestamp": datetime.fromtimestamp(old + i, timezone.utc).isoformat(), "source": "pytest", "payload": {"blob": "x" * 200}} for i in range(50)]
+    await client.post("/publish", json={"events": events})
+    await asyncio.sleep(0.1)
+
+    report = (await client.get("/admin/memory")).json()
+    topic = report["topics"]["mem.test"]
+    assert topic["events"] == 50
+    assert 50 * 200 < topic["bytes"] < 50 * 2000
+    assert report["structures"]["topics_cache"] == topic["bytes"]
+    assert report["estimated_bytes"] >= topic["bytes"]
+    assert (await client.get("/admin/memory?tracemalloc=true")).status_code == 409
+
+    # Target separuh cache -> sekitar separuh event tertua pindah ke arsip
+    moved = await aggregator.evict_memory(topic["bytes"] // 2)
+    assert 20 <= moved <= 30
+    remaining = [e["event_id"] for e in await aggregator.get_events("mem.test")]
+    assert remaining == [f"ev-mem-{i}" for i in range(moved, 50)]
+    after = (await client.get("/admin/memory")).json()["topics"]["mem.test"]
+    assert after["events"] == 50 - moved
+    assert after["bytes"] <= topic["bytes"] // 2
+
+
+async def test_publish_wait_acks_after_commit(client):
+    """?wait=true: respons 202 berarti event sudah ada di store (tanpa sleep)."""
+    now = datetime.now(timezone.utc).isoformat()
+    events = [{"topic": "ack.test", "event_id": f"ev-ack-{i % 3}", "timestamp": now, "source": "pytest", "payload": {}} for i in range(5)]
+    resp = await client.post("/publish?wait=true", json={"events": events})
+    assert resp.status_code == 202
+    assert resp.json()["status"] == "committed"
+
+    data = (await client.get("/stats")).json()
+    assert data["unique_events"] == 3
+    assert data["duplicates"] == 2
+
+    from main import aggregator
+    assert aggregator._acks == {}
+
+
+async def test_publish_wait_fails_when_store_write_fails(client, monkeypatch):
+    """Store gagal commit: ack ?wait=true -> 503, dan batch tidak dihitung sebagai duplikat."""
+    from main import aggregator
+
+    async def broken(events, policy=None):
+        raise OSError("disk penuh")
+
+    monkeypatch.setattr(aggregator.store, "check_and_add_batch", broken)
+    ev = {"topic": "fail.test", "event_id": "ev-fail-1", "timestamp": datetime.now(timezone.utc).isoformat(), "source": "pytest", "payload": {}}
+    resp = await client.post("/publish?wait=true", json=ev)
+    assert resp.status_code == 503
+
+    data = (await client.get("/stats")).json()
+    assert data["unique_events"] == 0
+    assert data["duplicates"] == 0
+    assert aggregator._acks == {}
+
+    # Setelah store pulih, retry publisher di-commit normal
+    monkeypatch.undo()
+    resp = await client.post("/publish?wait=true", json=ev)
+    assert resp.status_code == 202
+    assert (await client.get("/stats")).json()["unique_events"] == 1
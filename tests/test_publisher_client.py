@@ -0,0 +1,93 @@
+# tests/test_publisher_client.py
+
+import asyncio
+import gzip
+import json
+import httpx
+import pytest
+from datetime import datetime, timezone
+
+from main import app
+from src.publisher_client import PublisherClient, PublishError
+
+
+def make_event(i, topic="client.test"):
+    return {"topic": topic, "event_id": f"ev-client-{i}", "timestamp": datetime.now(timezone.utc).isoformat(), "source": "pytest-client", "payload": {"i": i}}
+
+
+async def test_batches_by_size_and_linger_with_gzip(client):
+    """Batch penuh dikirim langsung, sisanya setelah linger; body gzip diterima server."""
+    async with PublisherClient("http://test", batch_size=50, linger=0.05,
+                               transport=httpx.ASGITransport(app=app)) as pub:
+        futures = await pub.publish_many([make_event(i) for i in range(120)])
+        await asyncio.sleep(0.2)  # 20 event sisa terkirim oleh linger, tanpa flush
+        assert all(f.done() and f.exception() is None for f in futures)
+        metrics = pub.metrics()
+        assert metrics["batches_sent"] == 3
+        assert metrics["events_sent"] == 120
+        assert metrics["latency_ms"]["p50"] is not None
+
+        await asyncio.sleep(0.1)
+        stats = await pub.get_stats()
+        assert stats["unique_events"] == 120
+
+
+async def test_retry_resends_same_event_ids():
+    """503/429 di-retry dengan body yang sama persis (event_id tidak berubah)."""
+    bodies = []
+
+    def handler(request):
+        bodies.append(json.loads(gzip.decompress(request.content) if request.headers.get("content-encoding") == "gzip" else request.content))
+        if len(bodies) == 1:
+            return httpx.Response(503)
+        if len(bodies) == 2:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(202, json={"status": "accepted"})
+
+    async with PublisherClient("http://test", batch_size=10, backoff_base=0.001,
+                               transport=httpx.MockTransport(handler)) as pub:
+        # Event tanpa event_id mendapat id SEBELUM dikirim, jadi retry memakai id yang sama
+        future = await pub.publish({"topic": "t", "source": "s", "payload": {}})
+        await pub.flush()
+        await future
+
+    assert len(bodies) == 3
+    ids = [[e["event_id"] for e in body["events"]] for body in bodies]
+    assert ids[0] == ids[1] == ids[2] and ids[0][0]
+    assert pub.metrics()["retries"] == 2
+
+
+async def test_permanent_error_fails_future():
+    async with PublisherClient("http://test", transport=httpx.MockTransport(lambda r: httpx.Response(422))) as pub:
+        future = await pub.publish(make_event(0))
+        await pub.flush()
+        with pytest.raises(PublishError):
+            await future
+        assert pub.metrics()["failed_events"] == 1
+
+
+async def test_durable_waits_for_commit():
+    """durable=True memakai /publish?wait=true; 503 (store gagal commit) di-retry."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(503 if len(requests) == 1 else 202, json={})
+
+    async with PublisherClient("http://test", durable=True, backoff_base=0.001,
+                               transport=httpx.MockTransport(handler)) as pub:
+        future = await pub.publish(make_event(0))
+        await pub.flush()
+        await future
+
+    assert len(requests) == 2
+    assert all(r.url.path == "/publish" and r.url.params["wait"] == "true" for r in requests)
+
+
+async def test_durable_against_app(client):
+    async with PublisherClient("http://test", durable=True, transport=httpx.ASGITransport(app=app)) as pub:
+        futures = await pub.publish_many([make_event(i, "client.durable") for i in range(30)])
+        await pub.flush()
+        await asyncio.gather(*futures)
+        # Tanpa sleep: ack berarti sudah di-commit dan tercermin di stats
+        assert (await pub.get_stats())["unique_events"] == 30
@@ -0,0 +1,46 @@
+# tests/test_timeseries.py
+
+import pytest
+
+from src.timeseries import OVERFLOW_KEY, TimeSeries
+
+def test_minute_buckets_per_topic_and_source():
+    ts = TimeSeries()
+    t0 = 1_700_000_040  # awal menit
+    ts.record({("a", "p1"): [3, 1], ("b", "p1"): [2, 0]}, now=t0)
+    ts.record({("a", "p2"): [1, 4]}, now=t0 + 61)
+
+    buckets = ts.query(resolution="minute", window=2, now=t0 + 61)
+    assert [(b["unique"], b["duplicates"]) for b in buckets] == [(5, 1), (1, 4)]
+
+    only_a_p1 = ts.query(topic="a", source="p1", window=2, now=t0 + 61)
+    assert [(b["unique"], b["duplicates"]) for b in only_a_p1] == [(3, 1), (0, 0)]
+
+    hourly = ts.query(topic="a", resolution="hour", window=1, now=t0 + 61)
+    assert (hourly[0]["unique"], hourly[0]["duplicates"]) == (4, 5)
+
+def test_ring_reuses_slots_after_24h():
+    ts = TimeSeries()
+    t0 = 1_700_000_040
+    ts.record({("a", "p"): [7, 0]}, now=t0)
+    # Tepat 24 jam kemudian slot yang sama dipakai ulang, hitungan lama tidak ikut terbaca
+    ts.record({("a", "p"): [1, 0]}, now=t0 + 24 * 3600)
+    assert ts.query(window=1, now=t0 + 24 * 3600)[0]["unique"] == 1
+    assert ts.query(window=1440, now=t0 + 24 * 3600)[0]["unique"] == 0
+
+def test_window_validation():
+    with pytest.raises(ValueError):
+        TimeSeries().query(resolution="hour", window=1000)
+
+def test_key_cap_folds_into_overflow():
+    ts = TimeSeries(max_keys=3)
+    t0 = 1_700_000_040
+    ts.record({(f"t{i}", "p"): [1, 0] for i in range(10)}, now=t0)
+    # 3 key pertama + satu key overflow, memori tidak tumbuh per pasangan baru
+    assert len(ts.series) == 4
+    assert ts.query(topic=OVERFLOW_KEY[0], window=1, now=t0)[0]["unique"] == 7
+    # Total tetap lengkap
+    assert ts.query(window=1, now=t0)[0]["unique"] == 10
+    # Key yang sudah punya ring tetap dihitung sendiri
+    ts.record({("t0", "p"): [2, 0]}, now=t0)
+    assert ts.query(topic="t0", window=1, now=t0)[0]["unique"] == 3